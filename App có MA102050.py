@@ -1,123 +1,105 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import datetime, os, json
+import datetime
 import plotly.express as px
-import plotly.graph_objects as go
 import streamlit.components.v1 as components
 
+import Data_Functions as data_functions
+import Dashboard_Functions as functions
+
+# Số điểm tối đa mỗi đường/cột gửi xuống trình duyệt (theo bề rộng biểu đồ, xem functions.downsample_lttb/downsample_bars)
+MAX_CHART_POINTS = functions.get_max_points()
+
 
 ##############################################
 # 1. Hàm tải dữ liệu chung từ file Excel
 ##############################################
 def load_data_for_date(date_str):
     """
-    Tải dữ liệu từ file Excel dựa trên chuỗi ngày đã nhập (YYYYMMDD).
-    File được đọc từ dòng 8 đến dòng 27 (bỏ qua 7 dòng đầu, chỉ lấy 20 dòng).
-    Dòng đầu (dòng 8) làm header, sau đó loại bỏ đuôi "L2" ở cột A nếu có.
+    Tra dữ liệu ngày date_str (YYYYMMDD) trong bảng tổng hợp thư mục Data GD
+    (mọi file chỉ đọc một lần, xem data_functions.load_daily_flow_store).
+    Trả về DataFrame cột "Ngành" + các cột giá trị, cùng thứ tự cột như trong file Excel.
     """
-    file_path = f"Data GD/FiinTrade_Ngành-chuyên-sâu_Phân-Loại-Nhà-Đầu-Tư__1 NGÀY_{date_str}.xlsx"
-    if not os.path.exists(file_path):
-        st.error(f"File không tồn tại: {file_path}")
-        return None
+    file_path = data_functions.daily_flow_path(date_str)
     try:
-        df_temp = pd.read_excel(file_path, header=None, skiprows=7, nrows=20)
-        df_temp.iloc[:, 0] = df_temp.iloc[:, 0].astype(str).str.replace(r'\s*L2$', '', regex=True)
-        df_temp.columns = df_temp.iloc[0]
-        df = df_temp[1:].reset_index(drop=True)
-        return df
+        df = data_functions.load_daily_flow_store().for_date(pd.to_datetime(date_str, format="%Y%m%d"))
     except Exception as e:
         st.error(f"Lỗi khi đọc file: {e}")
         return None
+    if df is None:
+        st.error(f"File không tồn tại: {file_path}")
+    return df
+
+
+# Tên dòng vốn trong tiêu đề heatmap theo từng loại nhà đầu tư
+FLOW_HEATMAP_TITLES = {
+    "Nước ngoài": "dòng vốn nước ngoài",
+    "Tự doanh": "dòng vốn tự doanh",
+    "Tổ chức trong nước": "Tổ chức trong nước Tổng GT Ròng",
+    "Cá nhân": "Cá nhân Tổng GT Ròng",
+}
 
 
-def get_offset_date_str(date_str, offset_days):
+def plot_flow_split_pie(ratios, investor):
     """
-    Trả về chuỗi ngày (YYYYMMDD) sau khi trừ đi offset_days.
+    Pie chart tỷ lệ % giữa <investor> Khớp Ròng và <investor> Thỏa thuận Ròng của một ngày
+    (ratios: một dòng của bảng split_ratios tính sẵn trong Data_Functions).
     """
-    date_obj = datetime.datetime.strptime(date_str, "%Y%m%d").date()
-    new_date = date_obj - datetime.timedelta(days=offset_days)
-    return new_date.strftime("%Y%m%d")
+    names = [f"{investor} {order_type} Ròng" for order_type in data_functions.ORDER_TYPES]
+    data_pie = {
+        "Loại": names,
+        "Tỷ lệ (%)": [ratios[name] for name in names]
+    }
+    return px.pie(data_pie, values="Tỷ lệ (%)", names="Loại", title=f"Tỷ lệ % giữa {names[0]} và {names[1]}",
+                  hole=0.3)
 
 
-##############################################
-# 2. Các hàm bổ trợ cho biểu đồ "Biều đồ về giá của từng cổ phiếu"
-##############################################
-def parse_mixed_date(date_str):
+def plot_flow_split_trend(ratios):
     """
-    Thử parse chuỗi ngày với dayfirst=True (dd/mm/yyyy).
-    Nếu lỗi, thử với dayfirst=False.
-    Ưu tiên dd/mm.
+    Xu hướng tỷ lệ % Khớp Ròng trên Tổng GT Ròng của từng loại nhà đầu tư qua các phiên.
     """
-    try:
-        return pd.to_datetime(date_str, dayfirst=True, errors='raise')
-    except Exception:
-        try:
-            return pd.to_datetime(date_str, dayfirst=False, errors='raise')
-        except Exception:
-            return pd.NaT
+    columns = {f"{investor} Khớp Ròng": investor for investor in data_functions.INVESTOR_TYPES}
+    df_plot = ratios[list(columns)].rename(columns=columns).rename_axis("Ngày").reset_index().melt(
+        id_vars="Ngày",
+        var_name="Nhà đầu tư",
+        value_name="Tỷ lệ (%)"
+    )
+    fig = px.line(df_plot, x="Ngày", y="Tỷ lệ (%)", color="Nhà đầu tư", markers=True,
+                  title="Xu hướng tỷ lệ % Khớp Ròng trên Tổng GT Ròng theo phiên")
+    fig.update_xaxes(type="category")
+    return fig
 
 
-def load_circle_packing_data(price_file, volume_file, start_date, end_date):
+##############################################
+# 2. Các hàm bổ trợ cho biểu đồ "Biều đồ về giá của từng cổ phiếu"
+##############################################
+def load_circle_packing_data(df_price, vol_sums, start_date, end_date):
     """
-    Đọc và xử lý dữ liệu từ file giá và volume trong khoảng thời gian được chọn.
+    Xử lý dữ liệu giá (đã parse cột ngày) và tổng lũy kế volume trong khoảng thời gian được chọn.
     Trả về DataFrame gồm các cột: symbol, sector, volume, PriceChange.
     """
-    df_price = pd.read_excel(price_file)
-    df_price.columns = (
-            ["symbol", "sector"] +
-            pd.to_datetime(df_price.columns[2:], format="%d/%m/%Y", dayfirst=True, errors="coerce")
-            .strftime("%Y-%m-%d").tolist()
-    )
     start_date_str = start_date.strftime("%Y-%m-%d")
     end_date_str = end_date.strftime("%Y-%m-%d")
-    if start_date_str not in df_price.columns or end_date_str not in df_price.columns:
+    if start_date not in df_price.columns or end_date not in df_price.columns:
         raise ValueError(f"Ngày {start_date_str} hoặc {end_date_str} không có trong dữ liệu giá!")
-    df_price = df_price[["symbol", "sector", start_date_str, end_date_str]].copy()
-    df_price["PriceChange"] = ((df_price[end_date_str] - df_price[start_date_str]) / df_price[start_date_str] * 100)
-
-    df_vol = pd.read_excel(volume_file)
-    df_vol.columns = (
-            ["symbol", "sector"] +
-            pd.to_datetime(df_vol.columns[2:], format="%d/%m/%Y", dayfirst=True, errors="coerce")
-            .strftime("%Y-%m-%d").tolist()
-    )
-    # Lấy các cột volume nằm trong khoảng [start_date_str, end_date_str]
-    date_cols_vol = [c for c in df_vol.columns[2:] if start_date_str <= c <= end_date_str]
-    if len(date_cols_vol) == 0:
+    df_price = df_price[["symbol", "sector", start_date, end_date]].copy()
+    # Giá lưu float32 => về float64 đúng số trong file trước khi tính % thay đổi
+    for col in (start_date, end_date):
+        df_price[col] = data_functions.exact_float64(df_price[col])
+    df_price["PriceChange"] = ((df_price[end_date] - df_price[start_date]) / df_price[start_date] * 100)
+
+    # Tổng volume trong khoảng [start_date, end_date] = hiệu hai cột lũy kế
+    if vol_sums.count(start_date, end_date) == 0:
         raise ValueError(f"Không có cột nào trong khoảng {start_date_str} đến {end_date_str} trong dữ liệu volume!")
-    df_vol["volume"] = df_vol[date_cols_vol].sum(axis=1)
-    df_vol = df_vol[["symbol", "sector", "volume"]]
+    df_vol = vol_sums.frame(start_date, end_date, "volume")
 
     df_merged = pd.merge(df_price, df_vol, on=["symbol", "sector"], how="inner")
     df_final = df_merged[["symbol", "sector", "volume", "PriceChange"]]
     return df_final
 
 
-def build_hierarchical_data(df_final):
-    """
-    Xây dựng dữ liệu phân cấp cho biểu đồ Circle Packing.
-    Trả về dictionary với cấu trúc phân cấp: root -> sector -> cổ phiếu.
-    """
-    root = {"name": "Toàn thị trường", "children": []}
-    unique_sectors = df_final["sector"].dropna().unique().tolist()
-    for sec in unique_sectors:
-        df_ind = df_final[df_final["sector"] == sec]
-        children_stocks = []
-        for _, row in df_ind.iterrows():
-            children_stocks.append({
-                "name": row["symbol"],
-                "value": float(row["volume"]),
-                "PriceChange": float(row["PriceChange"]) if not pd.isna(row["PriceChange"]) else 0
-            })
-        root["children"].append({
-            "name": sec,
-            "children": children_stocks
-        })
-    return root
-
-
-def generate_circle_packing_html(hierarchical_data_json):
+def generate_circle_packing_html(hierarchical_data_json, d3_script):
     """
     Tạo HTML với D3.js để hiển thị biểu đồ Circle Packing với tooltip và nền trong suốt.
     """
@@ -125,7 +107,7 @@ def generate_circle_packing_html(hierarchical_data_json):
     <html>
     <head>
         <meta charset="utf-8">
-        <script src="https://d3js.org/d3.v7.min.js"></script>
+        {d3_script}
         <style>
             body {{
                 margin: 0;
@@ -179,7 +161,7 @@ def generate_circle_packing_html(hierarchical_data_json):
                 .attr("r", function(d) {{ return d.r; }})
                 .attr("fill", function(d) {{
                     if(d.depth === 0) return "#f0f0f0";
-                    else if(d.depth === 1) return "#add8e6";
+                    else if(d.children) return "#add8e6";
                     else return (d.data.PriceChange >= 0) ? "#2ecc71" : "#e74c3c";
                 }})
                 .attr("stroke", "#999")
@@ -209,6 +191,32 @@ def generate_circle_packing_html(hierarchical_data_json):
     return html_code
 
 
+@data_functions.cached_loader
+def load_circle_packing_chart(price_file, volume_file, start_date, end_date, levels=("sector",),
+                              d3_file=data_functions.D3_FILE):
+    """
+    Bảng dữ liệu + HTML biểu đồ bong bóng cho khoảng (start_date, end_date).
+    Cache theo (file giá, file volume, ngày bắt đầu, ngày kết thúc) => vẽ lại cùng khoảng ngày không tốn gì.
+    levels: các cấp nhóm bong bóng, VD ("sector",) hoặc data_functions.ICB_LEVELS (ngành ICB cấp 1 -> 3).
+    d3_file: file D3 cục bộ, nằm trong khóa cache (kèm mtime/size) => khi file được thêm/đổi, HTML được tạo lại.
+    HTML = None nếu chưa có file D3.
+    """
+    df_final = load_circle_packing_data(
+        data_functions.load_date_frame(price_file, "float32"),
+        data_functions.load_range_sum(volume_file),
+        start_date,
+        end_date
+    )
+    df_final = df_final.sort_values(by=["sector", "volume", "PriceChange"], ascending=[False, False, False])
+    if tuple(levels) != ("sector",):
+        df_final = data_functions.attach_icb_levels(df_final, levels)
+    json_data = data_functions.hierarchy_json(df_final, levels, extra_cols=("PriceChange",))
+    d3_script = data_functions.load_d3_script(d3_file)
+    if d3_script is None:
+        return df_final, None
+    return df_final, generate_circle_packing_html(json_data, d3_script)
+
+
 ##############################################
 # 3. Main ứng dụng Streamlit
 ##############################################
@@ -233,7 +241,8 @@ def main():
     if dashboard_option == "Phân loại ngành":
         st.markdown("### Hiển thị thống kê các ngành trong thị trường chứng khoán")
         file_path = "Phan_loai_nganh.xlsx"
-        df = pd.read_excel(file_path)
+        # Mã, Sàn, Ngành ICB - cấp N ở dạng Categorical => lọc isin trên codes
+        df = data_functions.load_icb_table(file_path)
         if "STT" in df.columns:
             df = df.drop("STT", axis=1)
 
@@ -268,7 +277,7 @@ def main():
         chart_layout = dict(width=350, height=350, margin=dict(l=20, r=20, t=40, b=20))
 
         if "Sàn" in filtered_df.columns:
-            counts = filtered_df["Sàn"].value_counts()
+            counts = filtered_df["Sàn"].cat.remove_unused_categories().value_counts()
             fig = px.bar(
                 x=counts.index,
                 y=counts.values,
@@ -293,7 +302,7 @@ def main():
                     col_field, title = icb_chart_columns[i + j]
                     if col_field in filtered_df.columns:
                         if col_field in ["Ngành ICB - cấp 3", "Ngành ICB - cấp 4"]:
-                            counts = filtered_df[col_field].value_counts()
+                            counts = filtered_df[col_field].cat.remove_unused_categories().value_counts()
                             total = counts.sum()
                             large = counts[counts / total * 100 >= 3]
                             small = counts[counts / total * 100 < 3]
@@ -302,7 +311,7 @@ def main():
                             final_counts = large
                             fig = px.pie(values=final_counts.values, names=final_counts.index, title=title, hole=0.3)
                         else:
-                            counts = filtered_df[col_field].value_counts()
+                            counts = filtered_df[col_field].cat.remove_unused_categories().value_counts()
                             fig = px.pie(values=counts.values, names=counts.index, title=title, hole=0.3)
                         fig.update_layout(**chart_layout)
                         cols[j].plotly_chart(fig, use_container_width=True)
@@ -313,7 +322,7 @@ def main():
     elif dashboard_option == "Vốn hóa của cổ phiếu và thị trường":
         st.write("Hiển thị sự tăng trưởng vốn hóa của từng cổ phiếu và mức độ phân bổ vốn hóa của thị trường.")
         file_path = "Vietnam_Marketcap(Final).xlsx"
-        df_marketcap = pd.read_excel(file_path)
+        df_marketcap = data_functions.categorize_columns(data_functions.load_workbook(file_path), {"symbol": "symbol"})
         st.dataframe(df_marketcap)
         st.subheader("Biểu đồ Line: Thay đổi vốn hóa của cổ phiếu")
         stock_input = st.text_input("Nhập mã cổ phiếu:")
@@ -371,270 +380,48 @@ def main():
             st.error("Ngày nhập không hợp lệ! Vui lòng nhập theo định dạng YYYYMMDD.")
             return
 
-        df_today = load_data_for_date(date_str)
-        df_d1 = load_data_for_date(get_offset_date_str(date_str, 1))
-        df_d2 = load_data_for_date(get_offset_date_str(date_str, 2))
-        df_d3 = load_data_for_date(get_offset_date_str(date_str, 3))
-        df_d4 = load_data_for_date(get_offset_date_str(date_str, 4))
-
-        if df_today is not None and df_d1 is not None and df_d2 is not None and df_d3 is not None and df_d4 is not None:
-            # --- Heatmap cho "Nước ngoài Tổng GT Ròng" ---
-            result = pd.DataFrame()
-            result["Ngành"] = df_today["Ngành"].values
-            result["D-1"] = df_today["Nước ngoài Tổng GT Ròng"].astype(float) - df_d1["Nước ngoài Tổng GT Ròng"].astype(
-                float)
-            result["D-2"] = df_today["Nước ngoài Tổng GT Ròng"].astype(float) - df_d2["Nước ngoài Tổng GT Ròng"].astype(
-                float)
-            result["D-3"] = df_today["Nước ngoài Tổng GT Ròng"].astype(float) - df_d3["Nước ngoài Tổng GT Ròng"].astype(
-                float)
-            result["D-4"] = df_today["Nước ngoài Tổng GT Ròng"].astype(float) - df_d4["Nước ngoài Tổng GT Ròng"].astype(
-                float)
-            df_heatmap = result.set_index("Ngành")[["D-1", "D-2", "D-3", "D-4"]]
-            z = df_heatmap.values
-            limit = max(abs(z.min()), abs(z.max()))
-            colorscale = [
-                [0.0, "rgba(255,0,0,0.7)"],
-                [0.5, "rgba(255,255,255,0.7)"],
-                [1.0, "rgba(0,255,0,0.7)"]
-            ]
-            heatmap = go.Heatmap(
-                z=df_heatmap.values,
-                x=df_heatmap.columns,
-                y=df_heatmap.index,
-                colorscale=colorscale,
-                zmin=-limit,
-                zmax=limit,
-                hoverongaps=False,
-                text=df_heatmap.values,
-                texttemplate="%{text:.2f}",
-                textfont={"size": 12}
-            )
-            fig = go.Figure(data=[heatmap])
-            date_obj = datetime.datetime.strptime(date_str, "%Y%m%d").date()
-            date_final = date_obj.strftime("%d/%m/%y")
-            fig.update_layout(
-                title={
-                    'text': f"Tổng hợp sự thay đổi về dòng vốn nước ngoài tại thời điểm {date_final}",
-                    'x': 0.5,
-                    'xanchor': 'center'
-                },
-                xaxis_title="<b>Sự thay đổi về giá so với từng thời điểm</b>",
-                yaxis_title="<b>Ngành</b>",
-                margin=dict(l=40, r=40, t=50, b=40),
-                paper_bgcolor="rgba(0,0,0,0)",
-                plot_bgcolor="rgba(0,0,0,0)",
-                font=dict(color="white")
-            )
-            fig.update_xaxes(tickangle=0, automargin=True)
-            fig.update_yaxes(automargin=True)
-            st.markdown("<br>", unsafe_allow_html=True)
-            st.plotly_chart(fig, use_container_width=True)
+        lookback = st.sidebar.slider("Số phiên so sánh (D-1 ... D-N):", min_value=1, max_value=20, value=4,
+                                     key="txn_lookback")
 
-            # --- Heatmap cho "Tự doanh Tổng GT Ròng" ---
-            st.markdown("### Heatmap: Thay đổi về Tự doanh Tổng GT Ròng")
-            result_td = pd.DataFrame()
-            result_td["Ngành"] = df_today["Ngành"].values
-            result_td["D-1"] = df_today["Tự doanh Tổng GT Ròng"].astype(float) - df_d1["Tự doanh Tổng GT Ròng"].astype(
-                float)
-            result_td["D-2"] = df_today["Tự doanh Tổng GT Ròng"].astype(float) - df_d2["Tự doanh Tổng GT Ròng"].astype(
-                float)
-            result_td["D-3"] = df_today["Tự doanh Tổng GT Ròng"].astype(float) - df_d3["Tự doanh Tổng GT Ròng"].astype(
-                float)
-            result_td["D-4"] = df_today["Tự doanh Tổng GT Ròng"].astype(float) - df_d4["Tự doanh Tổng GT Ròng"].astype(
-                float)
-            df_heatmap_td = result_td.set_index("Ngành")[["D-1", "D-2", "D-3", "D-4"]]
-            z_td = df_heatmap_td.values
-            limit_td = max(abs(z_td.min()), abs(z_td.max()))
-            heatmap_td = go.Heatmap(
-                z=df_heatmap_td.values,
-                x=df_heatmap_td.columns,
-                y=df_heatmap_td.index,
-                colorscale=colorscale,
-                zmin=-limit_td,
-                zmax=limit_td,
-                hoverongaps=False,
-                text=df_heatmap_td.values,
-                texttemplate="%{text:.2f}",
-                textfont={"size": 12}
-            )
-            fig_td = go.Figure(data=[heatmap_td])
-            fig_td.update_layout(
-                title={
-                    'text': f"Tổng hợp sự thay đổi về dòng vốn tự doanh tại thời điểm {date_final}",
-                    'x': 0.5,
-                    'xanchor': 'center'
-                },
-                xaxis_title="<b>Sự thay đổi về giá so với từng thời điểm</b>",
-                yaxis_title="<b>Ngành</b>",
-                margin=dict(l=40, r=40, t=50, b=40),
-                paper_bgcolor="rgba(0,0,0,0)",
-                plot_bgcolor="rgba(0,0,0,0)",
-                font=dict(color="white")
-            )
-            fig_td.update_xaxes(tickangle=0, automargin=True)
-            fig_td.update_yaxes(automargin=True)
-            st.markdown("<br>", unsafe_allow_html=True)
-            st.plotly_chart(fig_td, use_container_width=True)
-
-            # --- Heatmap cho "Tổ chức trong nước Tổng GT Ròng" ---
-            st.markdown("### Heatmap: Thay đổi về Tổ chức trong nước Tổng GT Ròng")
-            result_org = pd.DataFrame()
-            result_org["Ngành"] = df_today["Ngành"].values
-            result_org["D-1"] = df_today["Tổ chức trong nước Tổng GT Ròng"].astype(float) - df_d1[
-                "Tổ chức trong nước Tổng GT Ròng"].astype(float)
-            result_org["D-2"] = df_today["Tổ chức trong nước Tổng GT Ròng"].astype(float) - df_d2[
-                "Tổ chức trong nước Tổng GT Ròng"].astype(float)
-            result_org["D-3"] = df_today["Tổ chức trong nước Tổng GT Ròng"].astype(float) - df_d3[
-                "Tổ chức trong nước Tổng GT Ròng"].astype(float)
-            result_org["D-4"] = df_today["Tổ chức trong nước Tổng GT Ròng"].astype(float) - df_d4[
-                "Tổ chức trong nước Tổng GT Ròng"].astype(float)
-            df_heatmap_org = result_org.set_index("Ngành")[["D-1", "D-2", "D-3", "D-4"]]
-            z_org = df_heatmap_org.values
-            limit_org = max(abs(z_org.min()), abs(z_org.max()))
-            heatmap_org = go.Heatmap(
-                z=df_heatmap_org.values,
-                x=df_heatmap_org.columns,
-                y=df_heatmap_org.index,
-                colorscale=colorscale,
-                zmin=-limit_org,
-                zmax=limit_org,
-                hoverongaps=False,
-                text=df_heatmap_org.values,
-                texttemplate="%{text:.2f}",
-                textfont={"size": 12}
-            )
-            fig_org = go.Figure(data=[heatmap_org])
-            fig_org.update_layout(
-                title={
-                    'text': f"Tổng hợp sự thay đổi về Tổ chức trong nước Tổng GT Ròng tại thời điểm {date_final}",
-                    'x': 0.5,
-                    'xanchor': 'center'
-                },
-                xaxis_title="<b>Sự thay đổi về giá so với từng thời điểm</b>",
-                yaxis_title="<b>Ngành</b>",
-                margin=dict(l=40, r=40, t=50, b=40),
-                paper_bgcolor="rgba(0,0,0,0)",
-                plot_bgcolor="rgba(0,0,0,0)",
-                font=dict(color="white")
-            )
-            fig_org.update_xaxes(tickangle=0, automargin=True)
-            fig_org.update_yaxes(automargin=True)
-            st.markdown("<br>", unsafe_allow_html=True)
-            st.plotly_chart(fig_org, use_container_width=True)
-
-            # --- Heatmap cho "Cá nhân Tổng GT Ròng" ---
-            st.markdown("### Heatmap: Thay đổi về Cá nhân Tổng GT Ròng")
-            result_ind = pd.DataFrame()
-            result_ind["Ngành"] = df_today["Ngành"].values
-            result_ind["D-1"] = df_today["Cá nhân Tổng GT Ròng"].astype(float) - df_d1["Cá nhân Tổng GT Ròng"].astype(
-                float)
-            result_ind["D-2"] = df_today["Cá nhân Tổng GT Ròng"].astype(float) - df_d2["Cá nhân Tổng GT Ròng"].astype(
-                float)
-            result_ind["D-3"] = df_today["Cá nhân Tổng GT Ròng"].astype(float) - df_d3["Cá nhân Tổng GT Ròng"].astype(
-                float)
-            result_ind["D-4"] = df_today["Cá nhân Tổng GT Ròng"].astype(float) - df_d4["Cá nhân Tổng GT Ròng"].astype(
-                float)
-            df_heatmap_ind = result_ind.set_index("Ngành")[["D-1", "D-2", "D-3", "D-4"]]
-            z_ind = df_heatmap_ind.values
-            limit_ind = max(abs(z_ind.min()), abs(z_ind.max()))
-            heatmap_ind = go.Heatmap(
-                z=df_heatmap_ind.values,
-                x=df_heatmap_ind.columns,
-                y=df_heatmap_ind.index,
-                colorscale=colorscale,
-                zmin=-limit_ind,
-                zmax=limit_ind,
-                hoverongaps=False,
-                text=df_heatmap_ind.values,
-                texttemplate="%{text:.2f}",
-                textfont={"size": 12}
-            )
-            fig_ind = go.Figure(data=[heatmap_ind])
-            fig_ind.update_layout(
-                title={
-                    'text': f"Tổng hợp sự thay đổi về Cá nhân Tổng GT Ròng tại thời điểm {date_final}",
-                    'x': 0.5,
-                    'xanchor': 'center'
-                },
-                xaxis_title="<b>Sự thay đổi về giá so với từng thời điểm</b>",
-                yaxis_title="<b>Ngành</b>",
-                margin=dict(l=40, r=40, t=50, b=40),
-                paper_bgcolor="rgba(0,0,0,0)",
-                plot_bgcolor="rgba(0,0,0,0)",
-                font=dict(color="white")
-            )
-            fig_ind.update_xaxes(tickangle=0, automargin=True)
-            fig_ind.update_yaxes(automargin=True)
-            st.markdown("<br>", unsafe_allow_html=True)
-            st.plotly_chart(fig_ind, use_container_width=True)
-
-            # --- Pie chart: Nước ngoài Khớp Ròng vs Nước ngoài Thỏa thuận Ròng ---
-            total_nuocngoai = abs(df_today["Nước ngoài Tổng GT Ròng"].astype(float).sum())
-            total_nuocngoai_khop = abs(df_today["Nước ngoài Khớp Ròng"].astype(float).sum())
-            total_nuocngoai_thoa = abs(df_today["Nước ngoài Thỏa thuận Ròng"].astype(float).sum())
-            perc_nuocngoai_khop = (total_nuocngoai_khop / total_nuocngoai) * 100 if total_nuocngoai != 0 else 0
-            perc_nuocngoai_thoa = (total_nuocngoai_thoa / total_nuocngoai) * 100 if total_nuocngoai != 0 else 0
-            data_pie_nuocngoai = {
-                "Loại": ["Nước ngoài Khớp Ròng", "Nước ngoài Thỏa thuận Ròng"],
-                "Tỷ lệ (%)": [perc_nuocngoai_khop, perc_nuocngoai_thoa]
-            }
-            fig_pie_nuocngoai = px.pie(data_pie_nuocngoai, values="Tỷ lệ (%)", names="Loại",
-                                       title="Tỷ lệ % giữa Nước ngoài Khớp Ròng và Nước ngoài Thỏa thuận Ròng",
-                                       hole=0.3)
-
-            # --- Pie chart: Tự doanh Khớp Ròng vs Tự doanh Thỏa thuận Ròng ---
-            total_tudn = abs(df_today["Tự doanh Tổng GT Ròng"].astype(float).sum())
-            total_tudn_khop = abs(df_today["Tự doanh Khớp Ròng"].astype(float).sum())
-            total_tudn_thoa = abs(df_today["Tự doanh Thỏa thuận Ròng"].astype(float).sum())
-            perc_tudn_khop = (total_tudn_khop / total_tudn) * 100 if total_tudn != 0 else 0
-            perc_tudn_thoa = (total_tudn_thoa / total_tudn) * 100 if total_tudn != 0 else 0
-            data_pie_tudn = {
-                "Loại": ["Tự doanh Khớp Ròng", "Tự doanh Thỏa thuận Ròng"],
-                "Tỷ lệ (%)": [perc_tudn_khop, perc_tudn_thoa]
-            }
-            fig_pie_tudn = px.pie(data_pie_tudn, values="Tỷ lệ (%)", names="Loại",
-                                  title="Tỷ lệ % giữa Tự doanh Khớp Ròng và Tự doanh Thỏa thuận Ròng", hole=0.3)
-
-            # Sắp xếp hai biểu đồ pie chart đầu tiên trên cùng 1 hàng
-            col1, col2 = st.columns(2)
-            with col1:
-                st.plotly_chart(fig_pie_nuocngoai, use_container_width=True)
-            with col2:
-                st.plotly_chart(fig_pie_tudn, use_container_width=True)
-
-            # --- Pie chart: Cá nhân Khớp Ròng vs Cá nhân Thỏa thuận Ròng ---
-            total_canhan = abs(df_today["Cá nhân Tổng GT Ròng"].astype(float).sum())
-            total_canhan_khop = abs(df_today["Cá nhân Khớp Ròng"].astype(float).sum())
-            total_canhan_thoa = abs(df_today["Cá nhân Thỏa thuận Ròng"].astype(float).sum())
-            perc_canhan_khop = (total_canhan_khop / total_canhan) * 100 if total_canhan != 0 else 0
-            perc_canhan_thoa = (total_canhan_thoa / total_canhan) * 100 if total_canhan != 0 else 0
-            data_pie_canhan = {
-                "Loại": ["Cá nhân Khớp Ròng", "Cá nhân Thỏa thuận Ròng"],
-                "Tỷ lệ (%)": [perc_canhan_khop, perc_canhan_thoa]
-            }
-            fig_pie_canhan = px.pie(data_pie_canhan, values="Tỷ lệ (%)", names="Loại",
-                                    title="Tỷ lệ % giữa Cá nhân Khớp Ròng và Cá nhân Thỏa thuận Ròng", hole=0.3)
-
-            # --- Pie chart: Tổ chức trong nước Khớp Ròng vs Tổ chức trong nước Thỏa thuận Ròng ---
-            total_tochuc = abs(df_today["Tổ chức trong nước Tổng GT Ròng"].astype(float).sum())
-            total_tochuc_khop = abs(df_today["Tổ chức trong nước Khớp Ròng"].astype(float).sum())
-            total_tochuc_thoa = abs(df_today["Tổ chức trong nước Thỏa thuận Ròng"].astype(float).sum())
-            perc_tochuc_khop = (total_tochuc_khop / total_tochuc) * 100 if total_tochuc != 0 else 0
-            perc_tochuc_thoa = (total_tochuc_thoa / total_tochuc) * 100 if total_tochuc != 0 else 0
-            data_pie_tochuc = {
-                "Loại": ["Tổ chức trong nước Khớp Ròng", "Tổ chức trong nước Thỏa thuận Ròng"],
-                "Tỷ lệ (%)": [perc_tochuc_khop, perc_tochuc_thoa]
-            }
-            fig_pie_tochuc = px.pie(data_pie_tochuc, values="Tỷ lệ (%)", names="Loại",
-                                    title="Tỷ lệ % giữa Tổ chức trong nước Khớp Ròng và Tổ chức trong nước Thỏa thuận Ròng",
-                                    hole=0.3)
-
-            # Sắp xếp hai biểu đồ pie chart tiếp theo trên cùng 1 hàng
-            col3, col4 = st.columns(2)
-            with col3:
-                st.plotly_chart(fig_pie_canhan, use_container_width=True)
-            with col4:
-                st.plotly_chart(fig_pie_tochuc, use_container_width=True)
+        investors = st.sidebar.multiselect("Heatmap theo loại nhà đầu tư:", list(data_functions.INVESTOR_TYPES),
+                                           default=list(data_functions.INVESTOR_TYPES), key="txn_investors")
+
+        df_today = load_data_for_date(date_str)
+        flow_changes = None
+        if df_today is not None:
+            # Chênh lệch Tổng GT Ròng của mọi loại nhà đầu tư đã chọn, mọi D-k, tính một lần
+            flow_changes = data_functions.flow_change_frames(
+                data_functions.load_daily_flow_store(), pd.Timestamp(current_date), lookback,
+                [f"{investor} Tổng GT Ròng" for investor in investors])
+            if flow_changes is None:
+                st.error(f"Không đủ {lookback} phiên giao dịch trước ngày {date_str} trong thư mục Data GD!")
+
+        if flow_changes is not None:
+
+            # --- Heatmap "<loại nhà đầu tư> Tổng GT Ròng" ---
+            date_final = current_date.strftime("%d/%m/%y")
+            for investor in investors:
+                st.markdown(f"### Heatmap: Thay đổi về {investor} Tổng GT Ròng")
+                fig = functions.plot_flow_heatmap(
+                    flow_changes[f"{investor} Tổng GT Ròng"],
+                    f"Tổng hợp sự thay đổi về {FLOW_HEATMAP_TITLES[investor]} tại thời điểm {date_final}",
+                    x_title="<b>Sự thay đổi về giá so với từng thời điểm</b>",
+                    y_title="<b>Ngành</b>")
+                st.markdown("<br>", unsafe_allow_html=True)
+                st.plotly_chart(fig, use_container_width=True)
+
+            # Tỷ lệ khớp lệnh/thỏa thuận đã tính sẵn theo ngày khi dựng bảng tổng hợp Data GD
+            split_ratios = data_functions.load_daily_flow_store().split_ratios.loc[:pd.Timestamp(current_date)]
+
+            # --- Pie chart: <loại nhà đầu tư> Khớp Ròng vs <loại nhà đầu tư> Thỏa thuận Ròng ---
+            # Sắp xếp hai biểu đồ pie chart trên cùng 1 hàng
+            for row_investors in (("Nước ngoài", "Tự doanh"), ("Cá nhân", "Tổ chức trong nước")):
+                for col, investor in zip(st.columns(2), row_investors):
+                    with col:
+                        st.plotly_chart(plot_flow_split_pie(split_ratios.iloc[-1], investor), use_container_width=True)
+
+            # --- Xu hướng tỷ lệ Khớp Ròng qua các phiên tới ngày đã chọn ---
+            st.plotly_chart(plot_flow_split_trend(split_ratios), use_container_width=True)
         else:
             st.error("Không đủ dữ liệu để tính toán hiệu số.")
 
@@ -683,11 +470,9 @@ def main():
             st.subheader("Toàn cảnh thị trường")
             price_file = "Vietnam_Price(Final).xlsx"
             volume_file = "Vietnam_volume(Final).xlsx"
-            df_temp = pd.read_excel(price_file)
-            date_cols_raw = df_temp.columns[2:]
-            date_cols_parsed = pd.to_datetime(date_cols_raw, format="%d/%m/%Y", dayfirst=True, errors="coerce")
-            valid_mask = ~date_cols_parsed.isna()
-            valid_date_cols = date_cols_parsed[valid_mask]
+            # Đọc + parse cột ngày một lần, dùng chung cho bong bóng và tỷ suất sinh lời
+            df_price = data_functions.load_date_frame(price_file, "float32")
+            valid_date_cols = pd.DatetimeIndex(df_price.columns[2:])
             if len(valid_date_cols) == 0:
                 st.error("Không tìm thấy cột ngày hợp lệ trong file giá!")
             else:
@@ -706,32 +491,28 @@ def main():
                     start_dt_tc = pd.to_datetime(start_date_tc)
                     end_dt_tc = pd.to_datetime(end_date_tc)
                     try:
-                        df_final = load_circle_packing_data(price_file, volume_file, start_dt_tc, end_dt_tc)
-                        df_final = df_final.sort_values(by=["sector", "volume", "PriceChange"],
-                                                        ascending=[False, False, False])
-                        root_dict = build_hierarchical_data(df_final)
-                        json_data = json.dumps(root_dict, ensure_ascii=False)
-                        html_code = generate_circle_packing_html(json_data)
-                        components.html(html_code, height=650)
+                        df_final, html_code = load_circle_packing_chart(price_file, volume_file, start_dt_tc, end_dt_tc)
+                        if html_code is None:
+                            st.error(f"Chưa có thư viện D3 ({data_functions.D3_FILE}) => không vẽ được biểu đồ bong bóng. "
+                                     "Chạy `python Data_Functions.py` trên máy có mạng để tải về.")
+                        else:
+                            components.html(html_code, height=650)
                         st.write("Dữ liệu hợp nhất:", df_final)
                     except Exception as e:
                         st.error(f"Lỗi: {str(e)}")
 
             st.subheader("Tỷ suất sinh lời trung bình theo ngành")
-            df_ret = pd.read_excel(price_file)
-            df_ret.columns = (
-                    ["symbol", "sector"]
-                    + pd.to_datetime(df_ret.columns[2:], format="%d/%m/%Y", dayfirst=True, errors="coerce").strftime(
-                "%Y-%m-%d").tolist()
-            )
             start_date_str = start_dt_tc.strftime("%Y-%m-%d")
             end_date_str = end_dt_tc.strftime("%Y-%m-%d")
-            if start_date_str not in df_ret.columns or end_date_str not in df_ret.columns:
+            if start_dt_tc not in df_price.columns or end_dt_tc not in df_price.columns:
                 st.warning(
                     f"Không tìm thấy cột {start_date_str} hoặc {end_date_str} trong file giá => không tính Return.")
             else:
-                df_ret["Return"] = (df_ret[end_date_str] - df_ret[start_date_str]) / df_ret[start_date_str]
-                sector_returns = df_ret.groupby("sector")["Return"].mean().reset_index()
+                df_ret = df_price[["symbol", "sector"]].copy()
+                start_price = data_functions.exact_float64(df_price[start_dt_tc])
+                end_price = data_functions.exact_float64(df_price[end_dt_tc])
+                df_ret["Return"] = (end_price - start_price) / start_price
+                sector_returns = df_ret.groupby("sector", observed=True)["Return"].mean().reset_index()
                 sector_returns["ReturnSign"] = np.where(sector_returns["Return"] >= 0, "Tỷ suất dương", "Tỷ suất âm")
                 fig_ret = px.bar(
                     sector_returns,
@@ -765,23 +546,14 @@ def main():
                 st.subheader("Biến động giá cổ phiếu")
 
                 file_price = "Vietnam_Price(Final).xlsx"
-                df_price = pd.read_excel(file_price)
-
-                # Parse cột ngày
-                parsed_dates = [parse_mixed_date(str(c)) for c in df_price.columns[2:]]
-                df_price.columns = list(df_price.columns[:2]) + parsed_dates
 
-                # Chuyển sang long format
-                df_price_melted = df_price.melt(
-                    id_vars=["symbol", "sector"],
-                    var_name="date",
-                    value_name="price"
-                )
+                # Panel giá (mã x ngày, float32), xây một lần lúc tải dữ liệu
+                price_panel = data_functions.load_panel(file_price, "price")
 
-                stock_list = df_price["symbol"].unique()
+                stock_list = price_panel.symbols
                 selected_stocks = st.multiselect("Chọn mã cổ phiếu:", options=stock_list)
 
-                valid_dates = df_price_melted["date"].dropna()
+                valid_dates = price_panel.dates
                 if valid_dates.empty:
                     st.error("Không có ngày hợp lệ trong file giá!")
                 else:
@@ -806,11 +578,7 @@ def main():
                     end_dt_line = pd.to_datetime(end_date_line)
 
                     # Lọc data
-                    df_filtered = df_price_melted[
-                        (df_price_melted["symbol"].isin(selected_stocks)) &
-                        (df_price_melted["date"] >= start_dt_line) &
-                        (df_price_melted["date"] <= end_dt_line)
-                        ]
+                    df_filtered = price_panel.select(selected_stocks, start_dt_line, end_dt_line)
 
                     if selected_stocks and not df_filtered.empty:
                         st.write(
@@ -826,11 +594,14 @@ def main():
                         )
 
                         # Biểu đồ line chung cho các cổ phiếu
+                        # Giảm điểm bằng LTTB theo từng mã (giữ điểm đầu/cuối, đỉnh và đáy)
+                        df_price_plot = functions.downsample_lttb(df_filtered, "date", "price", MAX_CHART_POINTS, group_by="symbol")
                         fig_price = px.line(
-                            df_filtered,
+                            df_price_plot,
                             x="date",
                             y="price",
                             color="symbol",
+                            render_mode=functions.get_render_mode(len(df_price_plot)),
                             title="Biến động giá (Nhiều cổ phiếu chung)"
                         )
                         fig_price.update_layout(yaxis_title="Giá cổ phiếu", xaxis_title="Ngày", height=400)
@@ -850,61 +621,42 @@ def main():
                             with col_ma50:
                                 show_ma50 = st.checkbox("MA50", value=False)
 
-                            # Lần lượt vẽ chart riêng cho mỗi cổ phiếu
-                            for stock in selected_stocks:
-                                sub = df_filtered[df_filtered["symbol"] == stock].copy()
-                                sub = sub.sort_values("date")
-
-                                # Tính MA nếu có check
-                                if show_ma10:
-                                    sub["MA10"] = sub["price"].rolling(window=10).mean()
-                                if show_ma20:
-                                    sub["MA20"] = sub["price"].rolling(window=20).mean()
-                                if show_ma50:
-                                    sub["MA50"] = sub["price"].rolling(window=50).mean()
-
-                                # Cột y cần vẽ
-                                y_cols = ["price"]  # Luôn có cột giá
-                                col_labels = ["Giá"]  # Nhãn hiển thị
-
-                                if show_ma10:
-                                    y_cols.append("MA10")
-                                    col_labels.append("MA10")
-                                if show_ma20:
-                                    y_cols.append("MA20")
-                                    col_labels.append("MA20")
-                                if show_ma50:
-                                    y_cols.append("MA50")
-                                    col_labels.append("MA50")
-
-                                # Vẽ line
-                                fig_single = px.line(
-                                    sub,
-                                    x="date",
-                                    y=y_cols,
-                                    title=f"[{stock}] Biểu đồ giá & MA (nếu có)"
-                                )
-
-                                color_map_ma = {
-                                    "price": "#0072B2",  # xanh
-                                    "MA10": "#FF0000",  # đỏ
-                                    "MA20": "#00A600",  # xanh lá
-                                    "MA50": "#8B00FF"  # tím
-                                }
-
-                                # Đổi tên legend + chỉnh màu
-                                for i, trace_name in enumerate(y_cols):
-                                    fig_single.data[i].name = col_labels[i]
-                                    # set màu
-                                    if trace_name in color_map_ma:
-                                        fig_single.data[i].line.color = color_map_ma[trace_name]
-
-                                fig_single.update_layout(
-                                    xaxis_title="Ngày",
-                                    yaxis_title="Giá cổ phiếu",
-                                    height=300
-                                )
-                                st.plotly_chart(fig_single, use_container_width=True)
+                            y_cols = ["price"]  # Luôn có cột giá
+                            if show_ma10:
+                                y_cols.append("MA10")
+                            if show_ma20:
+                                y_cols.append("MA20")
+                            if show_ma50:
+                                y_cols.append("MA50")
+
+                            # MA đã tính sẵn cho cả thị trường khi ingest (data_functions.load_price_indicators)
+                            # => chỉ cắt theo mã & khoảng ngày, ghép vào df_filtered theo index của price_panel.select
+                            indicator_cols = y_cols[1:]
+                            if indicator_cols:
+                                indicator_panel = data_functions.load_price_indicators(file_price)
+                                df_filtered[indicator_cols] = indicator_panel.select(
+                                    selected_stocks, start_dt_line, end_dt_line, indicator_cols)
+
+                            color_map_ma = {
+                                "price": "#0072B2",  # xanh
+                                "MA10": "#FF0000",  # đỏ
+                                "MA20": "#00A600",  # xanh lá
+                                "MA50": "#8B00FF"  # tím
+                            }
+
+                            # Một figure chung: mỗi mã một hàng subplot, trục x dùng chung
+                            # (tự chuyển sang Scattergl khi tổng số điểm vượt functions.WEBGL_POINT_THRESHOLD)
+                            fig_single = functions.plot_symbol_subplots(
+                                df_filtered,
+                                selected_stocks,
+                                y_cols,
+                                names={"price": "Giá"},
+                                colors=color_map_ma,
+                                title_format="[{}] Biểu đồ giá & MA (nếu có)",
+                                x_title="Ngày",
+                                y_title="Giá cổ phiếu",
+                            )
+                            st.plotly_chart(fig_single, use_container_width=True)
 
                     else:
                         st.warning("Vui lòng chọn mã cổ phiếu (hoặc không có dữ liệu trong khoảng này).")
@@ -912,12 +664,10 @@ def main():
             if show_volume_chart:
                 st.subheader("Khối lượng giao dịch")
                 file_volume = "Vietnam_volume(Final).xlsx"
-                df_volume = pd.read_excel(file_volume)
-                parsed_dates_vol = [parse_mixed_date(str(c)) for c in df_volume.columns[2:]]
-                df_volume.columns = list(df_volume.columns[:2]) + parsed_dates_vol
-                df_volume_melted = df_volume.melt(id_vars=["symbol", "sector"], var_name="Date", value_name="Volume")
-                stock_list_vol = df_volume["symbol"].unique()
-                valid_dates_vol = df_volume_melted["Date"].dropna()
+                volume_panel = data_functions.load_panel(file_volume, "Volume", "integer")
+
+                stock_list_vol = volume_panel.symbols
+                valid_dates_vol = volume_panel.dates
                 if valid_dates_vol.empty:
                     st.error("Không có ngày hợp lệ trong file volume!")
                 else:
@@ -934,14 +684,13 @@ def main():
                                                 min_value=min_v.date(), max_value=max_v.date())
                     start_vol_dt = pd.to_datetime(start_vol)
                     end_vol_dt = pd.to_datetime(end_vol)
-                    df_selected_vol = df_volume_melted[
-                        (df_volume_melted["symbol"] == selected_stock_vol) &
-                        (df_volume_melted["Date"] >= start_vol_dt) &
-                        (df_volume_melted["Date"] <= end_vol_dt)
-                        ]
+                    df_selected_vol = volume_panel.select([selected_stock_vol], start_vol_dt, end_vol_dt).rename(
+                        columns={"date": "Date"})
                     st.write(
                         f"Dữ liệu từ **{start_vol_dt.strftime('%d/%m/%Y')}** đến **{end_vol_dt.strftime('%d/%m/%Y')}**")
-                    fig_volume = px.bar(df_selected_vol, x="Date", y="Volume",
+                    # Cột khối lượng: cộng dồn theo nhóm phiên liên tiếp bằng nhau (không bỏ phiên nào)
+                    df_volume_plot = functions.downsample_bars(df_selected_vol, "Date", "Volume", MAX_CHART_POINTS)
+                    fig_volume = px.bar(df_volume_plot, x="Date", y="Volume",
                                         title=f"Khối lượng giao dịch của {selected_stock_vol}")
                     fig_volume.update_layout(yaxis_title="Khối lượng giao dịch", xaxis_title="Ngày")
                     st.plotly_chart(fig_volume, use_container_width=True)
@@ -952,60 +701,13 @@ def main():
     elif dashboard_option == "Thống kê dòng tiền giao dịch":
         st.write("Thể hiện chi tiết thống kê về dòng tiền giao dịch trong thời gian được chọn.")
 
-        excel_file = "Thong_ke_gia_Phan_loai_NDT__VNINDEX(Final).xlsx"
-        df_ca_nhan_trong_nuoc = pd.read_excel(excel_file, sheet_name="Cá nhân trong nước (Ròng)")
-        df_ca_nhan_nuoc_ngoai = pd.read_excel(excel_file, sheet_name="Cá nhân nước ngoài (Ròng)")
-        df_to_chuc_trong_nuoc = pd.read_excel(excel_file, sheet_name="Tổ chức trong nước (Ròng)")
-        df_to_chuc_nuoc_ngoai = pd.read_excel(excel_file, sheet_name="Tổ chức nước ngoài (Ròng)")
-
-        # Giả sử mỗi sheet có cột:
-        #   Ngày, GT ròng khớp lệnh (nghìn VND), GT ròng thỏa thuận (nghìn VND)
-
-        # ============ 1) Chuẩn bị từng sheet: chỉ lấy 3 cột, rồi rename ============
-        df_ca_nhan_trong_nuoc = df_ca_nhan_trong_nuoc[["Ngày",
-                                                       "GT ròng khớp lệnh (nghìn VND)",
-                                                       "GT ròng thỏa thuận (nghìn VND)"]]
-        df_ca_nhan_trong_nuoc = df_ca_nhan_trong_nuoc.rename(columns={
-            "GT ròng khớp lệnh (nghìn VND)": "Cá nhân trong nước - Khớp",
-            "GT ròng thỏa thuận (nghìn VND)": "Cá nhân trong nước - Thỏa thuận"
-        })
-
-        df_ca_nhan_nuoc_ngoai = df_ca_nhan_nuoc_ngoai[["Ngày",
-                                                       "GT ròng khớp lệnh (nghìn VND)",
-                                                       "GT ròng thỏa thuận (nghìn VND)"]]
-        df_ca_nhan_nuoc_ngoai = df_ca_nhan_nuoc_ngoai.rename(columns={
-            "GT ròng khớp lệnh (nghìn VND)": "Cá nhân nước ngoài - Khớp",
-            "GT ròng thỏa thuận (nghìn VND)": "Cá nhân nước ngoài - Thỏa thuận"
-        })
-
-        df_to_chuc_trong_nuoc = df_to_chuc_trong_nuoc[["Ngày",
-                                                       "GT ròng khớp lệnh (nghìn VND)",
-                                                       "GT ròng thỏa thuận (nghìn VND)"]]
-        df_to_chuc_trong_nuoc = df_to_chuc_trong_nuoc.rename(columns={
-            "GT ròng khớp lệnh (nghìn VND)": "Tổ chức trong nước - Khớp",
-            "GT ròng thỏa thuận (nghìn VND)": "Tổ chức trong nước - Thỏa thuận"
-        })
-
-        df_to_chuc_nuoc_ngoai = df_to_chuc_nuoc_ngoai[["Ngày",
-                                                       "GT ròng khớp lệnh (nghìn VND)",
-                                                       "GT ròng thỏa thuận (nghìn VND)"]]
-        df_to_chuc_nuoc_ngoai = df_to_chuc_nuoc_ngoai.rename(columns={
-            "GT ròng khớp lệnh (nghìn VND)": "Tổ chức nước ngoài - Khớp",
-            "GT ròng thỏa thuận (nghìn VND)": "Tổ chức nước ngoài - Thỏa thuận"
-        })
-
-        # ============ 2) Gộp 4 sheet thành 1 DF wide-format theo cột "Ngày" ============
-        wide_df = pd.merge(df_ca_nhan_trong_nuoc, df_ca_nhan_nuoc_ngoai, on="Ngày", how="outer")
-        wide_df = pd.merge(wide_df, df_to_chuc_trong_nuoc, on="Ngày", how="outer")
-        wide_df = pd.merge(wide_df, df_to_chuc_nuoc_ngoai, on="Ngày", how="outer")
-
-        # Chuyển cột "Ngày" thành datetime, sắp xếp
-        wide_df["Ngày"] = pd.to_datetime(wide_df["Ngày"], errors="coerce")
-        wide_df = wide_df.sort_values("Ngày")
+        # ============ 1) + 2) Đọc 4 sheet (Ròng) trong một lần mở file, gộp thành DF wide-format theo "Ngày" ============
+        # Index: Ngày (đã sắp xếp), cột MultiIndex (Nhà đầu tư, Loại) với Loại là Khớp/Thỏa thuận (có bộ nhớ đệm)
+        wide_df = data_functions.load_flow_statistics()
 
         # ============ 3) Cho user chọn khoảng thời gian (nằm ở phần chính, không phải sidebar) ============
-        min_date = wide_df["Ngày"].min()
-        max_date = wide_df["Ngày"].max()
+        min_date = wide_df.index.min()
+        max_date = wide_df.index.max()
 
         col_date1, col_date2 = st.columns(2)
         with col_date1:
@@ -1020,32 +722,16 @@ def main():
             return
 
         # Lọc wide_df theo khoảng thời gian
-        mask = (wide_df["Ngày"] >= pd.to_datetime(start_date)) & (wide_df["Ngày"] <= pd.to_datetime(end_date))
+        mask = (wide_df.index >= pd.to_datetime(start_date)) & (wide_df.index <= pd.to_datetime(end_date))
         filtered_df = wide_df[mask].copy()
         if filtered_df.empty:
             st.warning("Không có dữ liệu trong khoảng thời gian này!")
             return
 
         # ============ 4) Chuyển sang long_df ============
-        value_vars = [c for c in filtered_df.columns if c != "Ngày"]
-        long_df = filtered_df.melt(
-            id_vars="Ngày",
-            value_vars=value_vars,
-            var_name="variable",
-            value_name="value"
-        )
-
-        # Tách "variable" => 2 cột: "Nhà đầu tư" và "Loại"
-        def parse_variable(var):
-            splitted = var.split(" - ")
-            if len(splitted) == 2:
-                investor, order_type = splitted
-            else:
-                investor, order_type = (var, "Unknown")
-            return investor, order_type
-
-        long_df[["Nhà đầu tư", "Loại"]] = long_df["variable"].apply(lambda x: pd.Series(parse_variable(x)))
-        long_df.drop(columns="variable", inplace=True)
+        # Hai mức cột (Nhà đầu tư, Loại) => melt ra thẳng 2 cột "Nhà đầu tư" và "Loại"
+        long_df = filtered_df.melt(value_name="value", ignore_index=False).reset_index()
+        long_df = data_functions.categorize_columns(long_df, {"Nhà đầu tư": "investor", "Loại": "order_type"})
 
         # Convert value sang float, NaN => 0
         long_df["value"] = pd.to_numeric(long_df["value"], errors="coerce").fillna(0)
@@ -1111,7 +797,7 @@ def main():
         # ---------------------------
         excel_file2 = "Thong_ke_gia_Phan_loai_NDT__VNINDEX.xlsx"
         # Nếu file có các dòng header phụ (như “Tổng”, “Trung bình”), bạn có thể cần bỏ qua bằng skiprows, ví dụ: skiprows=2
-        df_source2 = pd.read_excel(excel_file2, skiprows=2)
+        df_source2 = data_functions.read_excel(excel_file2, skiprows=2)
 
         # Chuyển cột "Ngày" sang kiểu datetime và loại bỏ các dòng không hợp lệ
         df_source2["Ngày"] = pd.to_datetime(df_source2["Ngày"], errors="coerce")
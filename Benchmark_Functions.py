@@ -0,0 +1,292 @@
+import copy
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+import Dashboard_Functions as functions
+import Data_Functions as data_functions
+
+
+##############################################
+# Đo tốc độ các hàm xử lý dữ liệu (chạy: python Benchmark_Functions.py)
+##############################################
+def make_date_header(n_dates=5000, mm_dd_share=0.02, seed=0):
+    """
+    Header giả lập n_dates cột ngày dạng chuỗi, phần lớn dd/mm/yyyy,
+    một phần nhỏ mm/dd/yyyy và ISO như trong các file Excel thực tế.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2005-01-03", periods=n_dates)
+    header = list(dates.strftime("%d/%m/%Y"))
+    for i in rng.choice(n_dates, int(n_dates * mm_dd_share), replace=False):
+        header[i] = dates[i].strftime("%m/%d/%Y") if dates[i].day > 12 else str(dates[i])
+    return header
+
+
+def bench_parse_date_header(n_dates=5000, repeat=3):
+    """
+    So sánh parse_mixed_date (vòng lặp từng cột) với parse_date_header (vector hóa).
+    """
+    header = make_date_header(n_dates)
+
+    expected = pd.DatetimeIndex([data_functions.parse_mixed_date(c) for c in header])
+    result = data_functions.parse_date_header(header)
+    assert result.equals(expected), "parse_date_header khác parse_mixed_date"
+
+    loop_time = min(timeit.repeat(
+        lambda: [data_functions.parse_mixed_date(c) for c in header], number=1, repeat=repeat))
+    data_functions._parse_header.cache_clear()
+    cold_time = timeit.timeit(lambda: data_functions.parse_date_header(header), number=1)
+    warm_time = min(timeit.repeat(lambda: data_functions.parse_date_header(header), number=1, repeat=repeat))
+
+    print(f"parse header {n_dates} cột:")
+    print(f"  parse_mixed_date (vòng lặp) : {loop_time * 1000:9.2f} ms")
+    print(f"  parse_date_header (lần đầu) : {cold_time * 1000:9.2f} ms  (x{loop_time / cold_time:.0f})")
+    print(f"  parse_date_header (đã nhớ)  : {warm_time * 1000:9.2f} ms")
+
+
+def _trading_strategy_loop(df, column="Price Close"):
+    """
+    Bản vòng lặp cũ của get_trading_strategy, giữ lại để đối chiếu kết quả.
+    """
+    buy_list, sell_list = [], []
+    flag = False
+    for i in range(len(df)):
+        if df["MACD"].iloc[i] > df["Signal"].iloc[i] and not flag:
+            buy_list.append(df[column].iloc[i])
+            sell_list.append(np.nan)
+            flag = True
+        elif df["MACD"].iloc[i] < df["Signal"].iloc[i] and flag:
+            buy_list.append(np.nan)
+            sell_list.append(df[column].iloc[i])
+            flag = False
+        else:
+            buy_list.append(np.nan)
+            sell_list.append(np.nan)
+    return pd.DataFrame({"Buy": buy_list, "Sell": sell_list}, index=df.index)
+
+
+def bench_trading_strategy(file_path="finland1.csv", repeat=3):
+    """
+    So sánh get_trading_strategy (vector hóa, theo từng mã) với vòng lặp cũ chạy riêng từng mã.
+    """
+    df = functions.load_data(file_path)
+    close = df.groupby("Ticker")["Price Close"]
+    ema_12 = close.transform(lambda s: s.ewm(span=12, adjust=False).mean())
+    ema_26 = close.transform(lambda s: s.ewm(span=26, adjust=False).mean())
+    df["MACD"] = ema_12 - ema_26
+    df["Signal"] = df.groupby("Ticker")["MACD"].transform(lambda s: s.ewm(span=9, adjust=False).mean())
+
+    def run_loop():
+        return pd.concat([_trading_strategy_loop(g) for _, g in df.groupby("Ticker", sort=False)])
+
+    expected = run_loop().reindex(df.index)
+    result = functions.get_trading_strategy(df.copy(), group_by="Ticker")
+    pd.testing.assert_frame_equal(result[["Buy", "Sell"]], expected)
+
+    loop_time = min(timeit.repeat(run_loop, number=1, repeat=repeat))
+    vector_time = min(timeit.repeat(
+        lambda: functions.get_trading_strategy(df.copy(), group_by="Ticker"), number=1, repeat=repeat))
+
+    print(f"get_trading_strategy {len(df)} dòng, {df['Ticker'].nunique()} mã:")
+    print(f"  vòng lặp từng dòng : {loop_time * 1000:9.2f} ms")
+    print(f"  vector hóa         : {vector_time * 1000:9.2f} ms  (x{loop_time / vector_time:.0f})")
+
+
+def make_stream_prices(n_tickers=5, n_bars=600, seed=0):
+    """
+    Giá đóng cửa giả lập nhiều mã, mỗi mã có đoạn NaN, đoạn giá không đổi và đoạn giá âm
+    (các trường hợp dễ lệch giữa tính tăng dần và tính theo lô).
+    """
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(n_tickers):
+        price = 50 + np.cumsum(rng.normal(0, 1, n_bars))
+        start = rng.integers(0, n_bars - 100)
+        price[start:start + 7] = np.nan
+        price[start + 30:start + 60] = price[start + 29]
+        price[start + 70:start + 90] -= price[start + 70:start + 90].max() + 5
+        if i == 0:
+            price[:20] = np.nan
+        frames.append(pd.DataFrame({
+            "Ticker": f"T{i}", "Date": pd.bdate_range("2020-01-01", periods=n_bars), "Price Close": price}))
+    # Xen kẽ các mã theo ngày như dữ liệu thực tế
+    return pd.concat(frames).sort_values(["Date", "Ticker"], kind="stable").reset_index(drop=True)
+
+
+def bench_indicator_stream(repeat=3, seed=0):
+    """
+    Kiểm tra IndicatorStream / EMAState / RollingMeanState (nạp giá theo từng khúc ngẫu nhiên)
+    cho kết quả trùng với get_indicators / get_ewm_mean / get_rolling_mean, rồi so tốc độ thêm một phiên mới.
+    """
+    rng = np.random.default_rng(seed)
+    df = make_stream_prices()
+    keys = df["Ticker"]
+
+    # Nạp theo khúc có độ dài ngẫu nhiên
+    stream = functions.IndicatorStream()
+    cuts = np.sort(rng.choice(np.arange(1, len(df)), 40, replace=False))
+    bounds = zip(np.r_[0, cuts], np.r_[cuts, len(df)])
+    result = pd.concat([stream.update(df.iloc[start:stop]) for start, stop in bounds])
+
+    expected = functions.get_indicators(df, group_by="Ticker")
+    for window in stream.ma_windows:
+        expected[f"MA{window}"] = functions.get_rolling_mean(df["Price Close"], window, keys)
+    columns = ["EMA-12", "EMA-26", "MACD", "Signal", "Histogram", "RSI", "RSI-SMA"]
+    columns += [f"MA{window}" for window in stream.ma_windows]
+    np.testing.assert_allclose(result[columns].to_numpy(), expected[columns].to_numpy(), rtol=1e-12, atol=1e-9)
+
+    # Từng trạng thái riêng lẻ với các tham số ewm/rolling khác nhau
+    close = df["Price Close"]
+    for kwargs in ({"span": 12, "adjust": False}, {"com": 13, "adjust": True, "min_periods": 14},
+                   {"span": 9, "adjust": True, "ignore_na": True}, {"com": 5, "adjust": False, "ignore_na": True}):
+        states = {}
+        values = [states.setdefault(t, functions.EMAState(**kwargs)).update(v) for t, v in zip(keys, close)]
+        np.testing.assert_allclose(values, functions.get_ewm_mean(close, keys, **kwargs).reindex(close.index),
+                                   rtol=1e-12, atol=1e-9)
+    for window, min_periods in ((5, None), (20, None), (10, 3)):
+        states = {}
+        values = [states.setdefault(t, functions.RollingMeanState(window, min_periods)).update(v)
+                  for t, v in zip(keys, close)]
+        expected_mean = close.groupby(keys, sort=False).rolling(window=window, min_periods=min_periods).mean()
+        np.testing.assert_allclose(values, expected_mean.reset_index(level=0, drop=True).reindex(close.index),
+                                   rtol=1e-12, atol=1e-9)
+
+    # Thêm một phiên mới cho mọi mã: cập nhật trạng thái so với tính lại toàn bộ lịch sử
+    stream = functions.IndicatorStream()
+    stream.update(df)
+    new_bars = df.groupby("Ticker").tail(1).assign(Date=lambda d: d["Date"] + pd.Timedelta(days=1))
+    full = pd.concat([df, new_bars], ignore_index=True)
+    batch_time = min(timeit.repeat(lambda: functions.get_indicators(full, group_by="Ticker"), number=1, repeat=repeat))
+    stream_time = min(timeit.repeat(lambda: copy.deepcopy(stream).update(new_bars), number=1, repeat=repeat))
+
+    print(f"IndicatorStream {len(df)} dòng, {df['Ticker'].nunique()} mã: khớp get_indicators (nạp theo {len(cuts) + 1} khúc)")
+    print(f"  tính lại toàn bộ     : {batch_time * 1000:9.2f} ms")
+    print(f"  thêm một phiên mới   : {stream_time * 1000:9.2f} ms  (gồm sao chép trạng thái)")
+
+
+def make_flow_store(n_dates=250, n_sectors=19, seed=0):
+    """
+    DailyFlowStore giả lập: n_dates phiên x n_sectors ngành, đủ 4 loại nhà đầu tư x (Khớp, Thỏa thuận, Tổng GT) Ròng.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2021-01-04", periods=n_dates)
+    sectors = [f"Ngành {i}" for i in range(n_sectors)]
+    columns = [f"{investor} {kind} Ròng" for kind in ("Khớp", "Thỏa thuận", "Tổng GT")
+               for investor in data_functions.INVESTOR_TYPES]
+    index = pd.MultiIndex.from_product([dates, sectors], names=["Ngày", "Ngành"])
+    table = pd.DataFrame(rng.normal(0, 100, (len(index), len(columns))), index=index, columns=columns)
+    return data_functions.DailyFlowStore(table)
+
+
+def _flow_changes_loop(store, date, lookback, columns):
+    """
+    Cách cũ: đọc từng ngày D-k rồi trừ từng cột một.
+    """
+    df_today = store.for_date(date)
+    df_prev = [store.for_date(d) for d in store.calendar.lookback(date, lookback)]
+    frames = {}
+    for col in columns:
+        result = pd.DataFrame()
+        result["Ngành"] = df_today["Ngành"].values
+        for k, df_d in enumerate(df_prev, start=1):
+            result[f"D-{k}"] = df_today[col].astype(float) - df_d[col].astype(float)
+        frames[col] = result.set_index("Ngành")
+    return frames
+
+
+def bench_flow_changes(lookback=20, repeat=5):
+    """
+    So sánh flow_change_frames (một lần broadcast trên khối ngày x ngành x cột) với vòng lặp từng cột, từng D-k.
+    """
+    store = make_flow_store()
+    date = store.dates[-1]
+    columns = [f"{investor} Tổng GT Ròng" for investor in data_functions.INVESTOR_TYPES]
+
+    expected = _flow_changes_loop(store, date, lookback, columns)
+    result = data_functions.flow_change_frames(store, date, lookback, columns)
+    for col in columns:
+        pd.testing.assert_frame_equal(result[col], expected[col], check_names=False)
+
+    print(f"heatmap dòng tiền {len(columns)} loại nhà đầu tư:")
+    for n in (4, lookback):
+        loop_time = min(timeit.repeat(lambda: _flow_changes_loop(store, date, n, columns), number=1, repeat=repeat))
+        cube_time = min(timeit.repeat(
+            lambda: data_functions.flow_change_frames(store, date, n, columns), number=1, repeat=repeat))
+        print(f"  D-1..D-{n:<2} vòng lặp : {loop_time * 1000:9.2f} ms   broadcast : {cube_time * 1000:9.2f} ms"
+              f"  (x{loop_time / cube_time:.0f})")
+
+
+def make_price_panel(n_symbols=1500, n_dates=2500, seed=0):
+    """
+    Panel giá giả lập n_symbols mã x n_dates phiên (bước ngẫu nhiên quanh 20.000 đồng).
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2015-01-05", periods=n_dates)
+    prices = 20000 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_symbols, n_dates)), axis=1))
+    df_wide = pd.DataFrame(prices, columns=dates)
+    df_wide.insert(0, "sector", [f"Ngành {i % 19}" for i in range(n_symbols)])
+    df_wide.insert(0, "symbol", [f"M{i:04d}" for i in range(n_symbols)])
+    return data_functions.Panel(df_wide, "price")
+
+
+def _indicators_loop(panel, symbols):
+    """
+    Cách cũ: mỗi lần chạy lại tính rolling/ewm cho từng mã rồi set_index/reset_index/merge để ghép MACD.
+    """
+    df = panel.select(symbols).sort_values(["symbol", "date"])
+    frames = []
+    for symbol in symbols:
+        sub = df[df["symbol"] == symbol].copy()
+        sub["MA10"] = sub["price"].rolling(window=10).mean()
+        sub["MA20"] = sub["price"].rolling(window=20).mean()
+        sub["MA50"] = sub["price"].rolling(window=50).mean()
+        macd = sub.set_index("date")[["price"]].copy()
+        macd["MACD"] = (macd["price"].ewm(span=12, adjust=False).mean()
+                        - macd["price"].ewm(span=26, adjust=False).mean())
+        macd["Signal"] = macd["MACD"].ewm(span=9, adjust=False).mean()
+        macd["Hist"] = macd["MACD"] - macd["Signal"]
+        frames.append(pd.merge(sub, macd.reset_index()[["date", "MACD", "Signal", "Hist"]], on="date", how="left"))
+    return pd.concat(frames, ignore_index=True)
+
+
+def bench_price_indicators(n_selected=20, repeat=3):
+    """
+    So sánh tính MA/MACD từng mã mỗi lần chạy lại với cắt từ IndicatorPanel tính sẵn cho cả thị trường.
+    """
+    panel = make_price_panel()
+    symbols = list(panel.symbols[:n_selected])
+    columns = ["MA10", "MA20", "MA50", "MACD", "Signal", "Hist"]
+
+    build_time = timeit.timeit(
+        lambda: data_functions.IndicatorPanel(panel, data_functions.compute_price_indicators(panel.values)), number=1)
+    indicators = data_functions.IndicatorPanel(panel, data_functions.compute_price_indicators(panel.values))
+
+    expected = _indicators_loop(panel, symbols)
+    result = indicators.select(symbols, columns=columns)
+    np.testing.assert_allclose(result.to_numpy(), expected[columns].to_numpy(), rtol=1e-5, atol=1e-2)
+
+    loop_time = min(timeit.repeat(lambda: _indicators_loop(panel, symbols), number=1, repeat=repeat))
+    slice_time = min(timeit.repeat(lambda: indicators.select(symbols, columns=columns), number=1, repeat=repeat))
+
+    print(f"MA/MACD {n_selected} mã x {len(panel.dates)} phiên:")
+    print(f"  tính sẵn cả thị trường ({len(panel.symbols)} mã, một lần) : {build_time * 1000:9.2f} ms")
+    print(f"  tính lại từng mã + merge                  : {loop_time * 1000:9.2f} ms")
+    print(f"  cắt từ IndicatorPanel                     : {slice_time * 1000:9.2f} ms  (x{loop_time / slice_time:.0f})")
+
+
+BENCHMARKS = {
+    "parse_date_header": bench_parse_date_header,
+    "trading_strategy": bench_trading_strategy,
+    "indicator_stream": bench_indicator_stream,
+    "flow_changes": bench_flow_changes,
+    "price_indicators": bench_price_indicators,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
@@ -12,25 +12,18 @@ DATA_FILE = "finland.csv"
 
 @st.cache_data
 def load_data(file_path):
-    df = pd.read_csv(file_path, parse_dates=["Date"])
+    df = pd.read_csv(file_path, parse_dates=["Date"], dtype={"Ticker": "category"})
     df.sort_values(by=["Ticker", "Date"], inplace=True)
     return df
 
-# Helper functions for indicators
-def calculate_macd(df):
-    short_ema = df["Price Close"].ewm(span=12, adjust=False).mean()
-    long_ema = df["Price Close"].ewm(span=26, adjust=False).mean()
-    df["MACD"] = short_ema - long_ema
-    df["Signal Line"] = df["MACD"].ewm(span=9, adjust=False).mean()
-    return df
+@st.cache_data
+def load_closed_dates(file_path):
+    return functions.get_closed_dates_by_ticker(load_data(file_path))
 
-def calculate_rsi(df, period=14):
-    delta = df["Price Close"].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-    rs = gain / loss
-    df["RSI"] = 100 - (100 / (1 + rs))
-    return df
+# Indicators for every ticker, computed once per file in a grouped pass
+@st.cache_data
+def load_indicators(file_path):
+    return functions.get_indicators(load_data(file_path), group_by="Ticker")
 
 # Initialize the Streamlit app
 st.markdown('''
@@ -74,9 +67,8 @@ else:
     st.markdown(f"## {ticker} - Price Data")
     st.dataframe(filtered_data)
 
-    # Add technical indicators
-    filtered_data = calculate_macd(filtered_data)
-    filtered_data = calculate_rsi(filtered_data)
+    # Technical indicators are precomputed on the full history of every ticker
+    filtered_data = load_indicators(DATA_FILE).loc[filtered_data.index]
 
     # Create subplots
     fig = make_subplots(
@@ -116,7 +108,7 @@ else:
     fig.add_trace(
         go.Scatter(
             x=filtered_data["Date"],
-            y=filtered_data["Signal Line"],
+            y=filtered_data["Signal"],
             line=dict(color="red", width=1),
             name="Signal Line",
         ),
@@ -128,7 +120,7 @@ else:
     fig.add_trace(
         go.Scatter(
             x=filtered_data["Date"],
-            y=filtered_data["RSI"],
+            y=filtered_data["RSI-SMA"],
             line=dict(color="purple", width=1),
             name="RSI",
         ),
@@ -156,6 +148,9 @@ else:
         template="plotly_dark",
     )
 
+    # Hide the days the ticker did not trade (weekends, holidays)
+    fig.update_xaxes(rangebreaks=[dict(values=load_closed_dates(DATA_FILE)[ticker])])
+
     # Render the chart
     st.plotly_chart(fig)
 
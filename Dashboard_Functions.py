@@ -1,3 +1,6 @@
+import math
+from collections import deque
+
 import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
@@ -5,64 +8,447 @@ from plotly.subplots import make_subplots
 
 # Load data from the local file
 def load_data(filepath):
-    """Load stock data from a local CSV file."""
-    df = pd.read_csv(filepath)
+    """Load stock data from a local CSV file (Ticker as a categorical)."""
+    df = pd.read_csv(filepath, dtype={'Ticker': 'category'})
     # Ensure Date is in datetime format
     df['Date'] = pd.to_datetime(df['Date'])
     return df
 
 def get_closed_dates(df):
     """Return a list containing all dates on which the stock market was closed."""
-    timeline = pd.date_range(start=df['Date'].iloc[0], end=df['Date'].iloc[-1])
-    df_dates = [day.strftime('%Y-%m-%d') for day in pd.to_datetime(df['Date'])]
-    closed_dates = [
-        day for day in timeline.strftime('%Y-%m-%d').tolist()
-        if day not in df_dates
-    ]
-    return closed_dates
+    dates = pd.to_datetime(df['Date']).to_numpy(dtype='datetime64[D]')
+    if len(dates) == 0:
+        return []
+    timeline = np.arange(dates[0], dates[-1] + np.timedelta64(1, 'D'))
+    closed_dates = np.setdiff1d(timeline, dates)
+    return np.datetime_as_string(closed_dates, unit='D').tolist()
+
+def get_closed_dates_by_ticker(df, ticker_column='Ticker'):
+    """Return a dict mapping each ticker to the dates on which it did not trade."""
+    return {
+        ticker: get_closed_dates(group)
+        for ticker, group in df[[ticker_column, 'Date']].groupby(ticker_column, sort=False, observed=True)
+    }
 
-def get_MACD(df, column='Price Close'):
-    """Return a DataFrame with the MACD indicator and related information."""
-    df['EMA-12'] = df[column].ewm(span=12, adjust=False).mean()
-    df['EMA-26'] = df[column].ewm(span=26, adjust=False).mean()
+def get_ewm_mean(series, group_keys=None, **kwargs):
+    """Return the exponentially weighted mean of a Series, computed per group when group_keys is given."""
+    if group_keys is None:
+        return series.ewm(**kwargs).mean()
+    return series.groupby(group_keys, sort=False, observed=True).ewm(**kwargs).mean().reset_index(level=0, drop=True)
+
+def get_rolling_mean(series, window, group_keys=None):
+    """Return the rolling mean of a Series, computed per group when group_keys is given."""
+    if group_keys is None:
+        return series.rolling(window=window).mean()
+    return series.groupby(group_keys, sort=False, observed=True).rolling(window=window).mean().reset_index(level=0, drop=True)
+
+def get_MACD(df, column='Price Close', group_by=None):
+    """Return a DataFrame with the MACD indicator and related information (per group if group_by is set)."""
+    keys = None if group_by is None else df[group_by]
+    df['EMA-12'] = get_ewm_mean(df[column], keys, span=12, adjust=False)
+    df['EMA-26'] = get_ewm_mean(df[column], keys, span=26, adjust=False)
     df['MACD'] = df['EMA-12'] - df['EMA-26']
-    df['Signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
+    df['Signal'] = get_ewm_mean(df['MACD'], keys, span=9, adjust=False)
     df['Histogram'] = df['MACD'] - df['Signal']
     return df
 
-def get_RSI(df, column='Price Close', time_window=14):
-    """Return a DataFrame with the RSI indicator for the specified time window."""
-    diff = df[column].diff(1)
-    up_chg = np.where(diff > 0, diff, 0)
-    down_chg = np.where(diff < 0, -diff, 0)
-    up_chg_avg = pd.Series(up_chg).ewm(com=time_window - 1, min_periods=time_window).mean()
-    down_chg_avg = pd.Series(down_chg).ewm(com=time_window - 1, min_periods=time_window).mean()
+def get_RSI(df, column='Price Close', time_window=14, group_by=None, method='ewm', name='RSI'):
+    """Return a DataFrame with the RSI indicator for the specified time window.
+
+    method='ewm' is Wilder's smoothing, method='sma' uses simple rolling means of gains and losses.
+    """
+    keys = None if group_by is None else df[group_by]
+    diff = df[column].diff(1) if keys is None else df[column].groupby(keys, sort=False, observed=True).diff(1)
+    up_chg = pd.Series(np.where(diff > 0, diff, 0), index=df.index)
+    down_chg = pd.Series(np.where(diff < 0, -diff, 0), index=df.index)
+    if method == 'ewm':
+        up_chg_avg = get_ewm_mean(up_chg, keys, com=time_window - 1, min_periods=time_window)
+        down_chg_avg = get_ewm_mean(down_chg, keys, com=time_window - 1, min_periods=time_window)
+    elif method == 'sma':
+        up_chg_avg = get_rolling_mean(up_chg, time_window, keys)
+        down_chg_avg = get_rolling_mean(down_chg, time_window, keys)
+    else:
+        raise ValueError(f"Unknown RSI method: {method}")
     RS = up_chg_avg / down_chg_avg
-    df['RSI'] = 100 - 100 / (1 + RS)
+    df[name] = 100 - 100 / (1 + RS)
     return df
 
-def get_trading_strategy(df, column='Price Close'):
-    """Return Buy/Sell signals based on the MACD strategy."""
-    buy_list, sell_list = [], []
-    flag = False
-    for i in range(len(df)):
-        if df['MACD'].iloc[i] > df['Signal'].iloc[i] and not flag:
-            buy_list.append(df[column].iloc[i])
-            sell_list.append(np.nan)
-            flag = True
-        elif df['MACD'].iloc[i] < df['Signal'].iloc[i] and flag:
-            buy_list.append(np.nan)
-            sell_list.append(df[column].iloc[i])
-            flag = False
-        else:
-            buy_list.append(np.nan)
-            sell_list.append(np.nan)
-    df['Buy'] = buy_list
-    df['Sell'] = sell_list
+def get_indicators(df, column='Price Close', group_by='Ticker', time_window=14):
+    """Return a copy of df with MACD, Signal, Wilder RSI and SMA RSI computed for every group at once."""
+    df = df.copy()
+    df = get_MACD(df, column, group_by=group_by)
+    df = get_RSI(df, column, time_window, group_by=group_by, method='ewm', name='RSI')
+    df = get_RSI(df, column, time_window, group_by=group_by, method='sma', name='RSI-SMA')
+    return df
+
+def get_crossover_state(macd, signal, group_starts):
+    """Return +1 on MACD/Signal bullish crossovers, -1 on bearish ones and 0 elsewhere."""
+    # 1 while MACD is above Signal, 0 while below, carried forward on ties/NaN
+    state = np.where(macd > signal, 1.0, np.where(macd < signal, 0.0, np.nan))
+    # Every group starts flat, exactly like the original flag=False
+    state[group_starts & np.isnan(state)] = 0.0
+    last_valid = np.where(np.isnan(state), 0, np.arange(len(state)))
+    np.maximum.accumulate(last_valid, out=last_valid)
+    state = state[last_valid]
+    previous = np.roll(state, 1)
+    previous[group_starts] = 0.0
+    return state - previous
+
+def get_trading_strategy(df, column='Price Close', group_by=None):
+    """Return Buy/Sell signals based on the MACD strategy, optionally per group (e.g. group_by='Ticker')."""
+    if len(df) == 0:
+        df['Buy'] = np.nan
+        df['Sell'] = np.nan
+        return df
+    if group_by is None:
+        order = np.arange(len(df))
+        group_starts = np.zeros(len(df), dtype=bool)
+        group_starts[0] = True
+    else:
+        # Stable sort keeps each group's rows in their original order
+        codes = df.groupby(group_by, sort=False, observed=True).ngroup().to_numpy()
+        order = np.argsort(codes, kind='stable')
+        group_starts = np.r_[True, codes[order][1:] != codes[order][:-1]]
+    macd = df['MACD'].to_numpy(dtype=float)[order]
+    signal = df['Signal'].to_numpy(dtype=float)[order]
+    crossover = np.empty(len(df))
+    crossover[order] = get_crossover_state(macd, signal, group_starts)
+    price = df[column].to_numpy(dtype=float)
+    df['Buy'] = np.where(crossover > 0, price, np.nan)
+    df['Sell'] = np.where(crossover < 0, price, np.nan)
     return df
 
-def plot_candlestick_chart(fig, df, row, column=1, plot_EMAs=True, plot_strategy=True):
-    """Return a Candlestick chart."""
+class EMAState:
+    """Exponentially weighted mean advanced one bar at a time, using the same recurrence as pandas ewm().mean()."""
+
+    def __init__(self, span=None, com=None, adjust=False, min_periods=0, ignore_na=False):
+        if span is not None:
+            com = (span - 1) / 2.0
+        alpha = 1. / (1. + com)
+        self.old_wt_factor = 1. - alpha
+        self.new_wt = 1. if adjust else alpha
+        self.adjust = adjust
+        self.ignore_na = ignore_na
+        self.min_periods = max(int(min_periods), 1)
+        self.weighted = np.nan
+        self.old_wt = 1.
+        self.nobs = 0
+
+    def update(self, value):
+        """Add one observation and return the current mean."""
+        value = float(value)
+        is_observation = value == value
+        self.nobs += is_observation
+        if self.weighted == self.weighted:
+            if is_observation or not self.ignore_na:
+                self.old_wt *= self.old_wt_factor
+                if is_observation:
+                    if self.weighted != value:
+                        self.weighted = self.old_wt * self.weighted + self.new_wt * value
+                        self.weighted /= (self.old_wt + self.new_wt)
+                    if self.adjust:
+                        self.old_wt += self.new_wt
+                    else:
+                        self.old_wt = 1.
+        elif is_observation:
+            self.weighted = value
+        return self.weighted if self.nobs >= self.min_periods else np.nan
+
+class RollingMeanState:
+    """Rolling mean advanced one bar at a time, using the same compensated sums as pandas rolling().mean()."""
+
+    def __init__(self, window, min_periods=None):
+        self.window = window
+        self.min_periods = window if min_periods is None else min_periods
+        self.values = deque()
+        self.nobs = 0
+        self.neg_ct = 0
+        self.sum_x = 0.
+        self.compensation_add = 0.
+        self.compensation_remove = 0.
+        self.num_consecutive_same_value = 0
+        self.prev_value = np.nan
+
+    def _add(self, value):
+        if value == value:
+            self.nobs += 1
+            y = value - self.compensation_add
+            t = self.sum_x + y
+            self.compensation_add = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1., value) < 0:
+                self.neg_ct += 1
+            if value == self.prev_value:
+                self.num_consecutive_same_value += 1
+            else:
+                self.num_consecutive_same_value = 1
+            self.prev_value = value
+
+    def _remove(self, value):
+        if value == value:
+            self.nobs -= 1
+            y = -value - self.compensation_remove
+            t = self.sum_x + y
+            self.compensation_remove = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1., value) < 0:
+                self.neg_ct -= 1
+
+    def update(self, value):
+        """Add one observation and return the mean of the last `window` observations."""
+        value = float(value)
+        if not self.values:
+            self.prev_value = value
+        if len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self.values.append(value)
+        self._add(value)
+        if self.nobs >= self.min_periods and self.nobs > 0:
+            result = self.sum_x / self.nobs
+            if self.num_consecutive_same_value >= self.nobs:
+                result = self.prev_value
+            elif self.neg_ct == 0 and result < 0:
+                result = 0.
+            elif self.neg_ct == self.nobs and result > 0:
+                result = 0.
+            return result
+        return np.nan
+
+class MACDState:
+    """Streaming counterpart of get_MACD."""
+
+    def __init__(self):
+        self.ema_12 = EMAState(span=12, adjust=False)
+        self.ema_26 = EMAState(span=26, adjust=False)
+        self.signal = EMAState(span=9, adjust=False)
+
+    def update(self, price):
+        """Add one closing price and return the MACD columns for that bar."""
+        ema_12 = self.ema_12.update(price)
+        ema_26 = self.ema_26.update(price)
+        macd = ema_12 - ema_26
+        signal = self.signal.update(macd)
+        return {'EMA-12': ema_12, 'EMA-26': ema_26, 'MACD': macd, 'Signal': signal, 'Histogram': macd - signal}
+
+class RSIState:
+    """Streaming counterpart of get_RSI (method='ewm' for Wilder's smoothing, 'sma' for rolling means)."""
+
+    def __init__(self, time_window=14, method='ewm'):
+        if method == 'ewm':
+            self.up_avg = EMAState(com=time_window - 1, adjust=True, min_periods=time_window)
+            self.down_avg = EMAState(com=time_window - 1, adjust=True, min_periods=time_window)
+        elif method == 'sma':
+            self.up_avg = RollingMeanState(time_window)
+            self.down_avg = RollingMeanState(time_window)
+        else:
+            raise ValueError(f"Unknown RSI method: {method}")
+        self.last_price = np.nan
+
+    def update(self, price):
+        """Add one closing price and return the RSI for that bar."""
+        price = float(price)
+        diff = price - self.last_price
+        self.last_price = price
+        up_chg_avg = self.up_avg.update(diff if diff > 0 else 0.)
+        down_chg_avg = self.down_avg.update(-diff if diff < 0 else 0.)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            RS = np.float64(up_chg_avg) / np.float64(down_chg_avg)
+            return float(100 - 100 / (1 + RS))
+
+class IndicatorStream:
+    """Per-ticker indicator state that is advanced with new bars instead of recomputing the full history.
+
+    The columns match get_indicators (plus MA<n> rolling means of the close for each window in ma_windows).
+    """
+
+    def __init__(self, column='Price Close', group_by='Ticker', time_window=14, ma_windows=(10, 20, 50)):
+        self.column = column
+        self.group_by = group_by
+        self.time_window = time_window
+        self.ma_windows = tuple(ma_windows)
+        self.states = {}
+
+    def _new_state(self):
+        return {
+            'MACD': MACDState(),
+            'RSI': RSIState(self.time_window, method='ewm'),
+            'RSI-SMA': RSIState(self.time_window, method='sma'),
+            'MA': {window: RollingMeanState(window) for window in self.ma_windows},
+        }
+
+    def update(self, df):
+        """Advance the state with new bars (in time order per ticker) and return them with their indicators."""
+        rows = []
+        for ticker, price in zip(df[self.group_by].to_numpy(), df[self.column].to_numpy(dtype=float)):
+            state = self.states.get(ticker)
+            if state is None:
+                state = self.states[ticker] = self._new_state()
+            row = state['MACD'].update(price)
+            row['RSI'] = state['RSI'].update(price)
+            row['RSI-SMA'] = state['RSI-SMA'].update(price)
+            for window, ma_state in state['MA'].items():
+                row[f'MA{window}'] = ma_state.update(price)
+            rows.append(row)
+        columns = ['EMA-12', 'EMA-26', 'MACD', 'Signal', 'Histogram', 'RSI', 'RSI-SMA']
+        columns += [f'MA{window}' for window in self.ma_windows]
+        indicators = pd.DataFrame(rows, index=df.index, columns=columns, dtype=float)
+        return pd.concat([df, indicators], axis=1)
+
+# Downsampling for charts
+DEFAULT_CHART_WIDTH = 1200
+OHLC_COLUMNS = ('Price Open', 'Price High', 'Price Low', 'Price Close')
+
+def get_max_points(width=DEFAULT_CHART_WIDTH, pixels_per_point=1):
+    """Return the number of points per trace worth sending for a chart of the given width in pixels."""
+    return max(int(width // pixels_per_point), 3)
+
+def _as_float_axis(values):
+    """Return x values as floats, converting datetimes to nanoseconds."""
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        values = values.astype('datetime64[ns]').astype(np.int64)
+    return values.astype(float)
+
+def lttb_indices(x, y, n_out):
+    """Return the positions kept by Largest-Triangle-Three-Buckets, plus the positions of the min and max of y."""
+    x = _as_float_axis(x)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    # First and last points are kept, the n - 2 points in between are split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    edges = np.append(edges, n)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi, next_hi = edges[i], edges[i + 1], edges[i + 2]
+        avg_x, avg_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    return np.union1d(selected, [y.argmin(), y.argmax()])
+
+def _lttb_positions(x, y, n_out):
+    """Return the LTTB positions of one series, keeping the first NaN of every gap so lines stay broken."""
+    y = np.asarray(y, dtype=float)
+    valid = ~np.isnan(y)
+    positions = np.flatnonzero(valid)
+    kept = positions[lttb_indices(np.asarray(x)[valid], y[valid], n_out)]
+    gaps = np.flatnonzero(~valid & np.r_[True, valid[:-1]])
+    return np.union1d(kept, gaps)
+
+def downsample_lttb(df, x, y, n_out, group_by=None):
+    """Return the rows of df kept by LTTB on (x, y), at most about n_out rows per group (rows must be sorted by x)."""
+    if group_by is None:
+        if len(df) <= n_out:
+            return df
+        return df.iloc[_lttb_positions(df[x].to_numpy(), df[y].to_numpy(), n_out)]
+    x_values, y_values = df[x].to_numpy(), df[y].to_numpy()
+    positions = []
+    for group_positions in df.groupby(group_by, sort=False, observed=True).indices.values():
+        if len(group_positions) <= n_out:
+            positions.append(group_positions)
+        else:
+            positions.append(group_positions[_lttb_positions(x_values[group_positions], y_values[group_positions], n_out)])
+    if not positions:
+        return df
+    return df.iloc[np.sort(np.concatenate(positions))]
+
+def _get_buckets(n, n_out):
+    """Return the bucket number of each of n consecutive rows split into n_out equal-width buckets."""
+    return np.arange(n) * n_out // n
+
+def downsample_bars(df, x, y, n_out):
+    """Return df summed into at most n_out equal-width buckets of consecutive rows (x = bucket start), for bar charts."""
+    if len(df) <= n_out:
+        return df
+    buckets = _get_buckets(len(df), n_out)
+    grouped = df.groupby(buckets, sort=False)
+    result = grouped.first()
+    result[x] = grouped[x].first()
+    result[y] = grouped[y].sum(min_count=1)
+    result.index = df.index[np.searchsorted(buckets, result.index)]
+    return result[df.columns]
+
+def downsample_ohlc(df, n_out, date_column='Date', ohlc_columns=OHLC_COLUMNS, volume_column='Volume'):
+    """Return df aggregated into at most n_out consecutive OHLC bars (open first, high max, low min, close last)."""
+    if len(df) <= n_out:
+        return df
+    buckets = _get_buckets(len(df), n_out)
+    open_column, high_column, low_column, close_column = ohlc_columns
+    agg = {column: 'last' for column in df.columns}
+    agg.update({date_column: 'first', open_column: 'first', high_column: 'max', low_column: 'min', close_column: 'last'})
+    if volume_column in df.columns:
+        agg[volume_column] = 'sum'
+    result = df.groupby(buckets, sort=False).agg(agg)
+    result.index = df.index[np.searchsorted(buckets, result.index)]
+    return result
+
+# WebGL traces and one-figure layouts for many symbols
+WEBGL_POINT_THRESHOLD = 5000
+
+def get_render_mode(n_points, threshold=WEBGL_POINT_THRESHOLD):
+    """Return the plotly express render_mode for a chart drawing n_points points."""
+    return 'webgl' if n_points > threshold else 'svg'
+
+def get_scatter_type(n_points, threshold=WEBGL_POINT_THRESHOLD):
+    """Return go.Scattergl above threshold points, go.Scatter otherwise."""
+    return go.Scattergl if n_points > threshold else go.Scatter
+
+def plot_symbol_subplots(df, symbols, y_columns, symbol_column='symbol', date_column='date', names=None, colors=None,
+                         title_format='{}', x_title=None, y_title=None, macd_columns=None, macd_title_format='{} MACD',
+                         row_height=300, macd_row_height=200, webgl_threshold=WEBGL_POINT_THRESHOLD):
+    """Return one figure with a row of y_columns lines (and a MACD row if macd_columns) per symbol, traces added in one batch."""
+    names, colors = names or {}, colors or {}
+    positions = df.groupby(symbol_column, sort=False, observed=True).indices
+    symbols = [symbol for symbol in symbols if symbol in positions]
+    rows_per_symbol = 2 if macd_columns else 1
+    heights = ([row_height, macd_row_height] if macd_columns else [row_height]) * max(len(symbols), 1)
+    titles = []
+    for symbol in symbols:
+        titles.append(title_format.format(symbol))
+        if macd_columns:
+            titles.append(macd_title_format.format(symbol))
+    n_lines = len(y_columns) + (2 if macd_columns else 0)
+    Scatter = get_scatter_type(sum(len(positions[symbol]) for symbol in symbols) * n_lines, webgl_threshold)
+    fig = make_subplots(rows=len(heights), cols=1, shared_xaxes=True, vertical_spacing=min(0.08, 0.3 / len(heights)),
+                        row_heights=heights, subplot_titles=titles, x_title=x_title)
+    dates = df[date_column].to_numpy()
+    values = {column: df[column].to_numpy() for column in list(y_columns) + list(macd_columns or ())}
+    traces, rows, axis_titles = [], [], {}
+    for i, symbol in enumerate(symbols):
+        row = i * rows_per_symbol + 1
+        rows_of_symbol = positions[symbol]
+        x = dates[rows_of_symbol]
+        for column in y_columns:
+            traces.append(Scatter(x=x, y=values[column][rows_of_symbol], mode='lines', name=names.get(column, column),
+                                  line=dict(color=colors.get(column)), legendgroup=column, showlegend=i == 0))
+            rows.append(row)
+        axis_titles[row] = y_title
+        if macd_columns:
+            macd_column, signal_column, hist_column = macd_columns
+            for column in (macd_column, signal_column):
+                traces.append(Scatter(x=x, y=values[column][rows_of_symbol], mode='lines', name=names.get(column, column),
+                                      line=dict(color=colors.get(column)), legendgroup=column, showlegend=i == 0))
+                rows.append(row + 1)
+            hist = values[hist_column][rows_of_symbol]
+            traces.append(go.Bar(x=x, y=hist, name=names.get(hist_column, hist_column),
+                                 marker_color=np.where(hist > 0, 'green', 'red'), opacity=0.5,
+                                 legendgroup=hist_column, showlegend=i == 0))
+            rows.append(row + 1)
+            axis_titles[row + 1] = names.get(macd_column, macd_column)
+    if traces:
+        fig.add_traces(traces, rows=rows, cols=[1] * len(rows))
+    fig.update_layout({f'yaxis{row if row > 1 else ""}': dict(title_text=title)
+                       for row, title in axis_titles.items() if title}, height=sum(heights))
+    return fig
+
+def plot_candlestick_chart(fig, df, row, column=1, plot_EMAs=True, plot_strategy=True, max_points=None):
+    """Return a Candlestick chart, bucketed into at most max_points bars when given."""
+    if max_points is not None:
+        df = downsample_ohlc(df, max_points)
     fig.add_trace(go.Candlestick(x=df['Date'],
                                  open=df['Price Open'],
                                  high=df['Price High'],
@@ -79,6 +465,46 @@ def plot_candlestick_chart(fig, df, row, column=1, plot_EMAs=True, plot_strategy
     fig.update_yaxes(title_text='Price', row=row, col=column)
     return fig
 
+def plot_flow_heatmap(df_heatmap, title, x_title=None, y_title=None):
+    """Return a heatmap of df_heatmap (rows x columns) on a color scale symmetric around 0."""
+    z = df_heatmap.values
+    finite = np.abs(z[np.isfinite(z)])
+    limit = finite.max() if finite.size else 0
+    colorscale = [
+        [0.0, "rgba(255,0,0,0.7)"],
+        [0.5, "rgba(255,255,255,0.7)"],
+        [1.0, "rgba(0,255,0,0.7)"]
+    ]
+    heatmap = go.Heatmap(
+        z=z,
+        x=df_heatmap.columns,
+        y=df_heatmap.index,
+        colorscale=colorscale,
+        zmin=-limit,
+        zmax=limit,
+        hoverongaps=False,
+        text=z,
+        texttemplate="%{text:.2f}",
+        textfont={"size": 12}
+    )
+    fig = go.Figure(data=[heatmap])
+    fig.update_layout(
+        title={
+            'text': title,
+            'x': 0.5,
+            'xanchor': 'center'
+        },
+        xaxis_title=x_title,
+        yaxis_title=y_title,
+        margin=dict(l=40, r=40, t=50, b=40),
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        font=dict(color="white")
+    )
+    fig.update_xaxes(tickangle=0, automargin=True)
+    fig.update_yaxes(automargin=True)
+    return fig
+
 def plot_MACD(fig, df, row, column=1):
     """Return a MACD chart."""
     df['Hist-Color'] = np.where(df['Histogram'] < 0, 'red', 'green')
@@ -0,0 +1,1197 @@
+import datetime
+import functools
+import glob
+import hashlib
+import inspect
+import json
+import math
+import os
+import sys
+import threading
+import unicodedata
+import urllib.request
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    # Không có pyarrow => luôn đọc trực tiếp từ Excel
+    feather = None
+
+# Thư mục chứa các snapshot dạng cột (Feather) của file Excel
+SNAPSHOT_DIR = ".snapshot"
+
+# Các bảng rộng (mã x ngày) dùng trong dashboard
+PRICE_FILE = "Vietnam_Price(Final).xlsx"
+VOLUME_FILE = "Vietnam_volume(Final).xlsx"
+MARKETCAP_FILE = "Vietnam_Marketcap(Final).xlsx"
+
+# Chỉ báo kỹ thuật tính sẵn cho cả thị trường từ file giá (xem load_price_indicators);
+# EMA12/EMA26 chỉ là bước trung gian của MACD nên không lưu
+PRICE_INDICATORS = ("MA10", "MA20", "MA50", "MACD", "Signal", "Hist")
+
+# Phân ngành ICB (cột "Mã" + các cấp ngành)
+ICB_FILE = "Phan_loai_nganh.xlsx"
+ICB_LEVELS = ("Ngành ICB - cấp 1", "Ngành ICB - cấp 2", "Ngành ICB - cấp 3")
+
+# File giao dịch theo ngày của FiinTrade (phân loại nhà đầu tư theo ngành)
+DAILY_FLOW_DIR = "Data GD"
+DAILY_FLOW_PREFIX = "FiinTrade_Ngành-chuyên-sâu_Phân-Loại-Nhà-Đầu-Tư__1 NGÀY_"
+INVESTOR_TYPES = ("Nước ngoài", "Tự doanh", "Tổ chức trong nước", "Cá nhân")
+ORDER_TYPES = ("Khớp", "Thỏa thuận")
+
+# Thống kê dòng tiền VNINDEX theo loại nhà đầu tư: mỗi sheet "<loại NĐT> (Ròng)" có cột Ngày + GT ròng
+FLOW_STATS_FILE = "Thong_ke_gia_Phan_loai_NDT__VNINDEX(Final).xlsx"
+FLOW_STATS_INVESTORS = ("Cá nhân trong nước", "Cá nhân nước ngoài", "Tổ chức trong nước", "Tổ chức nước ngoài")
+FLOW_STATS_COLUMNS = {"GT ròng khớp lệnh (nghìn VND)": "Khớp", "GT ròng thỏa thuận (nghìn VND)": "Thỏa thuận"}
+
+# Thư viện D3 dùng cho biểu đồ bong bóng: luôn nhúng bản lưu cục bộ; thiếu file => tải một lần từ CDN về file này
+D3_FILE = os.path.join("static", "d3.v7.min.js")
+D3_CDN_URL = "https://d3js.org/d3.v7.min.js"
+
+# Giới hạn bộ nhớ đệm dùng chung (MB), chỉnh qua biến môi trường DATA_CACHE_MAX_MB
+DATA_CACHE_MAX_MB = int(os.environ.get("DATA_CACHE_MAX_MB", "512"))
+
+
+##############################################
+# 1. Bộ nhớ đệm dùng chung cho mọi dashboard
+##############################################
+def file_signature(file_path):
+    """
+    Trả về chữ ký (mtime_ns, size) của file (hoặc thư mục).
+    Chữ ký thay đổi mỗi khi file nguồn được ghi đè => dùng làm khóa snapshot/bộ nhớ đệm.
+    """
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _sizeof(value):
+    """
+    Ước lượng số byte mà một giá trị chiếm trong bộ nhớ đệm.
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(_sizeof(v) for v in value)
+    if isinstance(value, dict):
+        return sum(_sizeof(k) + _sizeof(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class DataCache:
+    """
+    Bộ nhớ đệm LRU dùng chung cho cả tiến trình (mọi phiên Streamlit, mọi lần rerun).
+    - Giới hạn tổng dung lượng max_bytes, vượt quá thì loại bỏ mục lâu không dùng nhất.
+    - Đếm số lần trúng (hits) / trượt (misses) để theo dõi hiệu quả.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Trả về (True, giá trị) nếu có trong bộ nhớ đệm, ngược lại (False, None).
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key][0]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        size = _sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+
+    def sizes(self):
+        """
+        Danh sách (khóa, số byte) của các mục, mục lâu không dùng nhất đứng trước.
+        """
+        with self._lock:
+            return [(key, size) for key, (_, size) in self._entries.items()]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+data_cache = DataCache(DATA_CACHE_MAX_MB * 1024 * 1024)
+
+
+def _cache_key(value):
+    """
+    Chuyển tham số thành khóa: đường dẫn file/thư mục tồn tại => (đường dẫn, mtime_ns, size),
+    nhờ vậy khi file nguồn thay đổi, khóa cũ tự hết hiệu lực.
+    """
+    if isinstance(value, str) and os.path.exists(value):
+        return (value,) + file_signature(value)
+    if isinstance(value, (tuple, list)):
+        return tuple(_cache_key(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _cache_key(v)) for k, v in value.items()))
+    return value
+
+
+def _format_cache_argument(value):
+    """
+    Tham số trong khóa cache để in: chữ ký đường dẫn (đường dẫn, mtime_ns, size) => repr của đường dẫn,
+    giá trị khác (kể cả tuple thường như danh sách nhà đầu tư) => repr nguyên vẹn.
+    """
+    if (isinstance(value, tuple) and len(value) == 3 and isinstance(value[0], str)
+            and isinstance(value[1], (int, float)) and isinstance(value[2], int)):
+        return repr(value[0])
+    return repr(value)
+
+
+def memory_report(cache=data_cache):
+    """
+    In số byte của từng bảng đang nằm trong bộ nhớ đệm (hàm tải + tham số), lớn nhất trước, kèm tổng.
+    Trả về DataFrame ("table", "bytes").
+    """
+    rows = []
+    for (_, name, arguments), size in cache.sizes():
+        params = ", ".join(f"{k}={_format_cache_argument(v)}" for k, v in arguments)
+        rows.append((f"{name}({params})", size))
+    report = pd.DataFrame(rows, columns=["table", "bytes"]).sort_values("bytes", ascending=False, ignore_index=True)
+    for table, size in report.itertuples(index=False):
+        print(f"{size / 1024 ** 2:10.2f} MB  {table}")
+    print(f"{report['bytes'].sum() / 1024 ** 2:10.2f} MB  tổng / giới hạn {cache.max_bytes / 1024 ** 2:.0f} MB")
+    return report
+
+
+def _copy_result(value):
+    """
+    Trả về bản sao nông để code gọi có thể đổi tên cột/thêm cột mà không làm hỏng dữ liệu trong bộ nhớ đệm.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    if isinstance(value, tuple):
+        return tuple(_copy_result(v) for v in value)
+    return value
+
+
+def cached_loader(func):
+    """
+    Decorator đưa kết quả của hàm tải dữ liệu vào data_cache.
+    Khóa = tên hàm + tham số, kể cả tham số mặc định (đường dẫn được kèm mtime/size của file).
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (func.__module__, func.__qualname__, _cache_key(list(bound.arguments.items())))
+        found, value = data_cache.get(key)
+        if not found:
+            value = func(*args, **kwargs)
+            data_cache.put(key, value)
+        return _copy_result(value)
+
+    return wrapper
+
+
+@cached_loader
+def read_excel(file_path, **kwargs):
+    """
+    pd.read_excel có bộ nhớ đệm (dùng cho các sheet/cách đọc không đi qua snapshot).
+    """
+    return pd.read_excel(file_path, **kwargs)
+
+
+##############################################
+# 2. Snapshot dạng cột cho các file Excel
+##############################################
+def snapshot_path(file_path, kind=""):
+    """
+    Đường dẫn snapshot Feather ứng với phiên bản hiện tại của file_path.
+    VD: Vietnam_Price(Final).xlsx => .snapshot/Vietnam_Price(Final)-<mtime_ns>-<size>.feather
+        kind=".indicators"        => .snapshot/Vietnam_Price(Final).indicators-<mtime_ns>-<size>.feather
+    """
+    mtime_ns, size = file_signature(file_path)
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(SNAPSHOT_DIR, f"{stem}{kind}-{mtime_ns}-{size}.feather")
+
+
+def normalize_header(columns):
+    """
+    Chuẩn hóa header về dạng chuỗi để ghi được ra Feather.
+    Ô header kiểu ngày của Excel => "dd/mm/yyyy" (cùng định dạng với các ô header dạng chuỗi).
+    """
+    return [
+        c.strftime("%d/%m/%Y") if isinstance(c, (datetime.date, pd.Timestamp)) else str(c)
+        for c in columns
+    ]
+
+
+def _arrow_safe(df):
+    """
+    Cột object chứa lẫn số và chuỗi => chuyển về chuỗi (giữ NaN) để Arrow ghi được.
+    """
+    for col in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[col], skipna=True).startswith("mixed"):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def write_snapshot(df, path):
+    """
+    Ghi df ra file Feather (ghi vào file tạm rồi đổi tên),
+    đồng thời xóa các snapshot cũ của cùng file nguồn.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    stem = os.path.basename(path).rsplit("-", 2)[0]
+    tmp_path = f"{path}.tmp"
+    feather.write_feather(df, tmp_path)
+    os.replace(tmp_path, path)
+    for old in glob.glob(os.path.join(glob.escape(os.path.dirname(path)), glob.escape(stem) + "-*.feather")):
+        if old != path:
+            os.remove(old)
+
+
+@cached_loader
+def load_workbook(file_path):
+    """
+    Đọc sheet đầu tiên của file Excel thông qua snapshot Feather.
+    - Snapshot còn mới (cùng mtime/size với file nguồn) => đọc memory-map, chỉ mất vài ms.
+    - Snapshot cũ hoặc chưa có => đọc Excel một lần rồi ghi lại snapshot.
+    """
+    if feather is not None:
+        path = snapshot_path(file_path)
+        if os.path.exists(path):
+            return feather.read_table(path, memory_map=True).to_pandas()
+
+    df = pd.read_excel(file_path)
+    df.columns = normalize_header(df.columns)
+    df = _arrow_safe(df)
+
+    if feather is not None:
+        try:
+            write_snapshot(df, path)
+        except OSError:
+            # Không ghi được snapshot (thư mục chỉ đọc, ...) => vẫn trả về dữ liệu
+            pass
+    return df
+
+
+def ingest_workbooks(file_paths=(PRICE_FILE, VOLUME_FILE, MARKETCAP_FILE)):
+    """
+    Chuyển trước các file Excel sang snapshot Feather (chạy một lần sau khi cập nhật dữ liệu).
+    """
+    for file_path in file_paths:
+        if os.path.exists(file_path):
+            df = load_workbook(file_path)
+            print(f"{file_path}: {df.shape[0]} dòng x {df.shape[1]} cột")
+        else:
+            print(f"{file_path}: không tồn tại, bỏ qua")
+    if PRICE_FILE in file_paths and os.path.exists(PRICE_FILE):
+        indicators = load_price_indicators(PRICE_FILE)
+        print(f"{PRICE_FILE}: {len(indicators.names)} chỉ báo x {indicators.shape[0]} mã x {indicators.shape[1]} ngày")
+
+
+##############################################
+# 3. Bảng rộng mã x ngày (giá, khối lượng)
+##############################################
+def parse_mixed_date(date_str):
+    """
+    Parse một ô header ngày: thử dayfirst=True (dd/mm/yyyy), lỗi thì dayfirst=False (mm/dd/yyyy).
+    Bản vô hướng, giữ lại làm chuẩn đối chiếu cho parse_date_header.
+    """
+    try:
+        return pd.to_datetime(date_str, dayfirst=True, errors="raise")
+    except (ValueError, TypeError, OverflowError):
+        pass
+    try:
+        return pd.to_datetime(date_str, dayfirst=False, errors="raise")
+    except (ValueError, TypeError, OverflowError):
+        return pd.NaT
+
+
+@functools.lru_cache(maxsize=32)
+def _parse_header(columns):
+    values = pd.Index(columns, dtype=object)
+
+    # Bước 1: cả header theo dd/mm/yyyy (định dạng chuẩn của file)
+    dates = pd.to_datetime(values, format="%d/%m/%Y", errors="coerce")
+
+    # Bước 2: ô không hợp lệ theo dd/mm (VD 01/13/2020) => thử mm/dd/yyyy
+    missing = dates.isna()
+    if missing.any():
+        dates = dates.where(~missing, pd.to_datetime(values, format="%m/%d/%Y", errors="coerce"))
+
+    # Bước 3: số ít ô còn lại (ISO, có giờ, ...) => parse từng ô như parse_mixed_date
+    missing = dates.isna()
+    if missing.any():
+        fallback = [parse_mixed_date(v) if m else pd.NaT for v, m in zip(values, missing)]
+        dates = dates.where(~missing, pd.DatetimeIndex(fallback))
+    return dates
+
+
+def parse_date_header(columns):
+    """
+    Parse cả dãy header ngày trong một lượt (thay cho vòng lặp parse_mixed_date trên từng cột).
+    Ưu tiên dd/mm, ô nào không hợp lệ mới thử mm/dd; ô không parse được => NaT.
+    Kết quả được nhớ theo nội dung header nên file giá và volume cùng header chỉ parse một lần.
+    """
+    return _parse_header(tuple(str(c) for c in columns))
+
+
+class CategoryRegistry:
+    """
+    Danh mục giá trị dùng chung cho các cột phân loại (mã, ngành, ngành ICB, sàn, loại nhà đầu tư)
+    giữa các bảng giá, khối lượng, vốn hóa và phân ngành.
+    - Mỗi tên (VD "symbol") có một CategoricalDtype; giá trị mới chỉ được thêm vào cuối, không xóa/đổi thứ tự
+      => codes của các Categorical đã tạo trước đó vẫn đúng.
+    - Các bảng tạo sau cùng dùng chung danh mục nên so sánh/isin/merge/groupby làm trên codes số nguyên.
+    """
+
+    def __init__(self):
+        self._codes = {}
+        self._dtypes = {}
+        self._lock = threading.Lock()
+
+    def dtype(self, name):
+        with self._lock:
+            return self._dtypes.get(name, pd.CategoricalDtype([]))
+
+    def categorize(self, values, name):
+        """
+        Chuyển values (Series/mảng) sang Categorical theo danh mục name, bổ sung giá trị mới nếu có.
+        Series => trả về Series cùng index/tên; NaN giữ nguyên là NaN.
+        """
+        uniques = pd.unique(pd.Series(values).dropna())
+        with self._lock:
+            codes = self._codes.setdefault(name, {})
+            new_values = [v for v in uniques if v not in codes]
+            if new_values or name not in self._dtypes:
+                for v in new_values:
+                    codes[v] = len(codes)
+                self._dtypes[name] = pd.CategoricalDtype(list(codes))
+            dtype = self._dtypes[name]
+        if isinstance(values, pd.Series):
+            return values.astype(dtype)
+        return pd.Categorical(values, dtype=dtype)
+
+
+# Danh mục dùng chung cho toàn bộ dashboard
+categories = CategoryRegistry()
+
+
+def categorize_columns(df, columns):
+    """
+    Bản sao của df với các cột trong columns ({cột: tên danh mục}) chuyển sang Categorical dùng chung.
+    Cột không có trong df thì bỏ qua.
+    """
+    return df.assign(**{col: categories.categorize(df[col], name) for col, name in columns.items() if col in df})
+
+
+@cached_loader
+def load_date_frame(file_path, value_dtype="float64"):
+    """
+    Đọc bảng rộng (symbol, sector, <ngày 1>, <ngày 2>, ...) và parse header ngày một lần duy nhất.
+    Trả về DataFrame gồm cột "symbol", "sector" (Categorical theo danh mục chung) và các cột ngày kiểu pd.Timestamp
+    (các cột không parse được ngày sẽ bị bỏ).
+    Các cột ngày được ép về số (ô không phải số => NaN) và lưu thành một khối value_dtype (VD "float32" cho giá).
+    Bảng thô đọc thẳng từ snapshot, không giữ thêm một bản trong bộ nhớ đệm.
+    """
+    df = load_workbook.__wrapped__(file_path)
+    dates = parse_date_header(df.columns[2:])
+    valid = ~dates.isna()
+    values = df.iloc[:, 2:].loc[:, valid]
+    if not all(pd.api.types.is_numeric_dtype(dtype) for dtype in values.dtypes):
+        values = values.apply(pd.to_numeric, errors="coerce")
+    values = pd.DataFrame(values.to_numpy(dtype=value_dtype), index=df.index, columns=dates[valid])
+    keys = df.iloc[:, :2].set_axis(["symbol", "sector"], axis=1)
+    return pd.concat([categorize_columns(keys, {"symbol": "symbol", "sector": "sector"}), values], axis=1)
+
+
+def exact_float64(values):
+    """
+    Đổi cột giá float32 (bảng gọn trong bộ nhớ đệm) về float64 trước khi tính toán hiển thị cho người dùng.
+    Đi qua biểu diễn thập phân ngắn nhất của float32 => lấy lại đúng số trong file (15.18 chứ không phải
+    15.180000305...), nên % thay đổi/tỷ suất ra đúng như khi đọc float64.
+    """
+    if isinstance(values, pd.Series):
+        return pd.Series(exact_float64(values.to_numpy()), index=values.index, name=values.name)
+    values = np.asarray(values)
+    if values.dtype == np.float32:
+        return values.astype(str).astype("float64")
+    return values.astype("float64")
+
+
+def _repeat_values(values, repeats):
+    """
+    np.repeat giữ nguyên kiểu Categorical (lặp codes, không đổi ra chuỗi).
+    """
+    values = getattr(values, "array", values)
+    if isinstance(values, pd.Categorical):
+        return pd.Categorical.from_codes(np.repeat(values.codes, repeats), dtype=values.dtype)
+    return np.repeat(np.asarray(values), repeats)
+
+
+def _integer_dtype(values):
+    """
+    Kiểu số nguyên nhỏ nhất (int8/16/32/64) chứa được mọi giá trị của values; có phần lẻ => None.
+    """
+    if values.size == 0:
+        return np.dtype("int8")
+    if not np.array_equal(values, np.floor(values)):
+        return None
+    lo, hi = values.min(), values.max()
+    for dtype in (np.int8, np.int16, np.int32, np.int64):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return np.dtype(dtype)
+    return None
+
+
+class Panel:
+    """
+    Bảng mã x ngày dạng gọn, xây một lần từ bảng rộng, để lọc theo mã và khoảng ngày.
+    - values: ma trận (mã x ngày) kiểu value_dtype; "integer" => số nguyên nhỏ nhất đủ chứa (khối lượng),
+      ô trống được đánh dấu riêng trong missing (không cần float để giữ NaN).
+    - dates: trục ngày dùng chung (tăng dần); symbols/sectors theo dòng, sectors là Categorical.
+    - offsets: {symbol: dòng} => lấy dữ liệu của một mã trong O(1); khoảng ngày chỉ tìm nhị phân một lần trên dates.
+    """
+
+    def __init__(self, df_wide, value_name, value_dtype="float32"):
+        self.value_name = value_name
+        dates = pd.DatetimeIndex(df_wide.columns[2:])
+        order = np.argsort(dates, kind="stable")
+        self.dates = dates[order]
+
+        # Mã trùng dòng => giữ dòng đầu tiên
+        first = ~df_wide["symbol"].duplicated().to_numpy()
+        self._symbols = df_wide["symbol"].array[first]
+        self.symbols = np.asarray(self._symbols, dtype=object)
+        self.sectors = df_wide["sector"].array[first]
+        self.offsets = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        values = df_wide.iloc[:, 2:].to_numpy(dtype="float64")[first][:, order]
+        self.missing = None
+        int_dtype = None
+        if value_dtype == "integer":
+            missing = np.isnan(values)
+            values = np.where(missing, 0, values)
+            int_dtype = _integer_dtype(values)
+            if int_dtype is None:
+                # Có giá trị lẻ => giữ float64 để không mất dữ liệu
+                values[missing] = np.nan
+            elif missing.any():
+                self.missing = missing
+        self.values = values.astype(int_dtype or ("float64" if value_dtype == "integer" else value_dtype))
+
+    @property
+    def nbytes(self):
+        return (self.values.nbytes + (0 if self.missing is None else self.missing.nbytes) + self.dates.nbytes
+                + int(pd.Series(self.symbols).memory_usage(deep=True)) + self.sectors.nbytes)
+
+    def bounds(self, start_date=None, end_date=None):
+        """
+        Vị trí (đầu, cuối) trên trục ngày của các ngày nằm trong [start_date, end_date] (None => không giới hạn).
+        """
+        start = 0 if start_date is None else self.dates.searchsorted(pd.Timestamp(start_date), side="left")
+        stop = len(self.dates) if end_date is None else self.dates.searchsorted(pd.Timestamp(end_date), side="right")
+        return start, max(start, stop)
+
+    def select(self, symbols, start_date=None, end_date=None):
+        """
+        Lọc các mã trong symbols trong khoảng [start_date, end_date].
+        Trả về DataFrame dạng dài (theo thứ tự symbols, mỗi mã theo ngày) với các cột symbol, date, sector,
+        <value_name> (float64, ô trống => NaN).
+        """
+        rows = np.array([self.offsets[symbol] for symbol in symbols if symbol in self.offsets], dtype=int)
+        start, stop = self.bounds(start_date, end_date)
+        block = self.values[rows, start:stop].astype("float64")
+        if self.missing is not None:
+            block[self.missing[rows, start:stop]] = np.nan
+        n_dates = stop - start
+        return pd.DataFrame({
+            "symbol": _repeat_values(self._symbols[rows], n_dates),
+            "date": np.tile(self.dates[start:stop].to_numpy(), len(rows)),
+            "sector": _repeat_values(self.sectors[rows], n_dates),
+            self.value_name: block.ravel(),
+        })
+
+
+@cached_loader
+def load_panel(file_path, value_name, value_dtype="float32"):
+    """
+    Panel gọn của bảng giá ("float32") hoặc khối lượng ("integer"), xây một lần cho mỗi phiên bản file.
+    """
+    # Dùng chung bảng rộng đã có trong bộ nhớ đệm: float32 với giá, float64 (như load_range_sum) với khối lượng
+    frame_dtype = "float64" if value_dtype == "integer" else value_dtype
+    return Panel(load_date_frame(file_path, frame_dtype), value_name, value_dtype)
+
+
+def compute_price_indicators(values, ma_windows=(10, 20, 50), short_window=12, long_window=26, signal_window=9):
+    """
+    Tính MA, MACD, Signal, Hist cho mọi mã cùng lúc trên ma trận giá (mã x ngày),
+    mỗi mã tính trên toàn bộ lịch sử của nó (rolling/ewm theo cột của bảng ngày x mã).
+    EMA ngắn/dài chỉ dùng để ra MACD, không giữ lại.
+    Trả về {tên chỉ báo: ma trận float32 (mã x ngày)}.
+    """
+    prices = pd.DataFrame(np.asarray(values, dtype="float64").T)
+    frames = {f"MA{window}": prices.rolling(window=window).mean() for window in ma_windows}
+    ema_short = prices.ewm(span=short_window, adjust=False).mean()
+    ema_long = prices.ewm(span=long_window, adjust=False).mean()
+    macd = ema_short - ema_long
+    signal = macd.ewm(span=signal_window, adjust=False).mean()
+    frames.update({
+        "MACD": macd,
+        "Signal": signal,
+        "Hist": macd - signal,
+    })
+    return {name: np.ascontiguousarray(frame.to_numpy(dtype="float32").T) for name, frame in frames.items()}
+
+
+class IndicatorPanel:
+    """
+    Chỉ báo kỹ thuật tính sẵn cho cả thị trường, cùng trục mã/ngày với Panel giá
+    => bật/tắt MA, MACD trên dashboard chỉ là cắt mảng theo mã và khoảng ngày.
+    """
+
+    def __init__(self, panel, indicators):
+        self.dates = panel.dates
+        self.offsets = panel.offsets
+        self.bounds = panel.bounds
+        self.indicators = indicators
+
+    @property
+    def names(self):
+        return list(self.indicators)
+
+    @property
+    def shape(self):
+        return next(iter(self.indicators.values())).shape
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for values in self.indicators.values())
+
+    def select(self, symbols, start_date=None, end_date=None, columns=None):
+        """
+        Các cột chỉ báo (float64) của symbols trong [start_date, end_date],
+        cùng thứ tự dòng và index với Panel.select(symbols, start_date, end_date).
+        """
+        rows = np.array([self.offsets[symbol] for symbol in symbols if symbol in self.offsets], dtype=int)
+        start, stop = self.bounds(start_date, end_date)
+        return pd.DataFrame({
+            name: self.indicators[name][rows, start:stop].astype("float64").ravel()
+            for name in (columns or self.names)
+        })
+
+
+@cached_loader
+def load_price_indicators(file_path=PRICE_FILE):
+    """
+    Chỉ báo kỹ thuật (PRICE_INDICATORS) của mọi mã trong file giá.
+    Tính một lần khi ingest (python Data_Functions.py) và lưu snapshot Feather cạnh snapshot của file giá;
+    dashboard chỉ đọc lại snapshot (tính lại nếu chưa có hoặc file giá đã đổi).
+    """
+    panel = load_panel(file_path, "price")
+    shape = panel.values.shape
+    path = snapshot_path(file_path, ".indicators") if feather is not None else None
+    if path is not None and os.path.exists(path):
+        table = feather.read_table(path, memory_map=True)
+        if table.num_rows == shape[0] * shape[1] and set(PRICE_INDICATORS) <= set(table.column_names):
+            return IndicatorPanel(panel, {
+                name: table.column(name).to_numpy().reshape(shape) for name in PRICE_INDICATORS
+            })
+
+    indicators = compute_price_indicators(panel.values)
+    if path is not None:
+        try:
+            # Mỗi chỉ báo một cột, dòng theo thứ tự (mã, ngày) của Panel giá
+            write_snapshot(pd.DataFrame({name: indicators[name].ravel() for name in PRICE_INDICATORS}), path)
+        except OSError:
+            pass
+    return IndicatorPanel(panel, indicators)
+
+
+class RangeSum:
+    """
+    Tổng lũy kế theo ngày (prefix sum) của bảng rộng mã x ngày.
+    Tổng của mỗi mã trong khoảng [start_date, end_date] bất kỳ = hiệu hai cột của ma trận lũy kế,
+    không phải cộng lại từng cột ngày cho mỗi lần chọn khoảng.
+    """
+
+    def __init__(self, df_wide):
+        self.symbols = df_wide["symbol"].array
+        self.sectors = df_wide["sector"].array
+        dates = pd.DatetimeIndex(df_wide.columns[2:])
+        order = np.argsort(dates, kind="stable")
+        self.dates = dates[order]
+
+        # Ô trống/không phải số (load_date_frame đã đổi thành NaN) => 0, giống DataFrame.sum bỏ qua NaN
+        values = df_wide.iloc[:, 2:].to_numpy(dtype=float)[:, order]
+        self.cumsum = np.zeros((values.shape[0], values.shape[1] + 1))
+        np.cumsum(np.nan_to_num(values), axis=1, out=self.cumsum[:, 1:])
+
+    @property
+    def nbytes(self):
+        return self.cumsum.nbytes + self.symbols.nbytes + self.sectors.nbytes + self.dates.nbytes
+
+    def bounds(self, start_date, end_date):
+        """
+        Vị trí (đầu, cuối) trong ma trận lũy kế của các ngày nằm trong [start_date, end_date].
+        """
+        start = self.dates.searchsorted(pd.Timestamp(start_date), side="left")
+        stop = self.dates.searchsorted(pd.Timestamp(end_date), side="right")
+        return start, max(start, stop)
+
+    def count(self, start_date, end_date):
+        """
+        Số cột ngày nằm trong [start_date, end_date].
+        """
+        start, stop = self.bounds(start_date, end_date)
+        return stop - start
+
+    def sum(self, start_date, end_date):
+        """
+        Mảng tổng của từng mã (theo thứ tự self.symbols) trong [start_date, end_date].
+        """
+        start, stop = self.bounds(start_date, end_date)
+        return self.cumsum[:, stop] - self.cumsum[:, start]
+
+    def frame(self, start_date, end_date, value_name="volume"):
+        """
+        DataFrame (symbol, sector, value_name) với value_name = tổng trong [start_date, end_date].
+        """
+        return pd.DataFrame({
+            "symbol": self.symbols,
+            "sector": self.sectors,
+            value_name: self.sum(start_date, end_date),
+        })
+
+
+@cached_loader
+def load_range_sum(file_path):
+    """
+    Ma trận lũy kế của bảng khối lượng, xây một lần cho mỗi phiên bản file.
+    """
+    return RangeSum(load_date_frame(file_path))
+
+
+##############################################
+# 4. Dữ liệu giao dịch theo ngày (thư mục Data GD)
+##############################################
+def load_daily_flow_file(file_path):
+    """
+    Đọc file FiinTrade phân loại nhà đầu tư theo ngày.
+    File được đọc từ dòng 8 đến dòng 27 (bỏ qua 7 dòng đầu, chỉ lấy 20 dòng).
+    Dòng đầu (dòng 8) làm header, sau đó loại bỏ đuôi "L2" ở cột A nếu có.
+    """
+    df_temp = pd.read_excel(file_path, header=None, skiprows=7, nrows=20)
+    df_temp.iloc[:, 0] = df_temp.iloc[:, 0].astype(str).str.replace(r'\s*L2$', '', regex=True)
+    df_temp.columns = df_temp.iloc[0]
+    df = df_temp[1:].reset_index(drop=True)
+    return df
+
+
+def daily_flow_path(date_str, folder=DAILY_FLOW_DIR):
+    """
+    Đường dẫn file FiinTrade của ngày date_str (YYYYMMDD).
+    """
+    return os.path.join(folder, f"{DAILY_FLOW_PREFIX}{date_str}.xlsx")
+
+
+def daily_flow_date(filename):
+    """
+    Ngày (pd.Timestamp) lấy từ tên file FiinTrade, VD ..._1 NGÀY_20221205.xlsx => 2022-12-05.
+    Tên file không đúng mẫu => None.
+    """
+    # Tên file có thể ở dạng Unicode tổ hợp (NFD) hoặc dựng sẵn (NFC) => so sánh sau khi chuẩn hóa
+    filename = unicodedata.normalize("NFC", filename)
+    prefix = unicodedata.normalize("NFC", DAILY_FLOW_PREFIX)
+    if not (filename.startswith(prefix) and filename.endswith(".xlsx")):
+        return None
+    try:
+        return pd.Timestamp(datetime.datetime.strptime(filename[len(prefix):-len(".xlsx")], "%Y%m%d"))
+    except ValueError:
+        return None
+
+
+class DailyFlowCatalog:
+    """
+    Danh mục các file ngày trong thư mục Data GD: ngày -> (đường dẫn, size, mtime_ns).
+    Tìm file của một ngày chỉ là tra dict, không phải duyệt lại thư mục.
+    """
+
+    def __init__(self, folder, entries):
+        self.folder = folder
+        self.entries = dict(sorted(entries.items()))
+        self.dates = pd.DatetimeIndex(list(self.entries))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, date):
+        return pd.Timestamp(date) in self.entries
+
+    @property
+    def signature(self):
+        """
+        Chữ ký ngắn của toàn bộ danh mục (tên file, size, mtime_ns của từng file):
+        đổi khi thêm/xóa file hoặc ghi đè nội dung một file (kể cả khi mtime của thư mục không đổi).
+        """
+        items = sorted((os.path.basename(path), size, mtime_ns) for path, size, mtime_ns in self.entries.values())
+        return hashlib.sha1(repr(items).encode("utf-8")).hexdigest()
+
+    def path(self, date):
+        """
+        Đường dẫn file của ngày date; không có file => None.
+        """
+        entry = self.entries.get(pd.Timestamp(date))
+        return None if entry is None else entry[0]
+
+
+def scan_daily_flow_folder(folder=DAILY_FLOW_DIR):
+    """
+    Duyệt thư mục Data GD một lần (os.scandir, lấy luôn size/mtime) để dựng DailyFlowCatalog.
+    Nhiều file trùng ngày => giữ file có tên đứng trước.
+    """
+    entries = {}
+    with os.scandir(folder) as it:
+        for entry in sorted(it, key=lambda e: e.name):
+            date = daily_flow_date(entry.name)
+            if date is not None and date not in entries and entry.is_file():
+                stat = entry.stat()
+                entries[date] = (entry.path, stat.st_size, stat.st_mtime_ns)
+    return DailyFlowCatalog(folder, entries)
+
+
+def load_daily_flow_catalog(folder=DAILY_FLOW_DIR):
+    """
+    DailyFlowCatalog của thư mục Data GD, duyệt lại mỗi lần gọi (một lần os.scandir, không đọc nội dung file)
+    để thấy cả file bị ghi đè tại chỗ - việc này không làm đổi mtime của thư mục.
+    """
+    return scan_daily_flow_folder(folder)
+
+
+def _unique_columns(columns):
+    """
+    Tên cột dạng chuỗi, không trùng (ô header trống => "Unnamed: i", trùng tên => "tên.1", "tên.2", ...).
+    """
+    result, seen = [], {}
+    for i, c in enumerate(columns):
+        name = f"Unnamed: {i}" if pd.isna(c) else str(c)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        result.append(name)
+    return result
+
+
+def _read_daily_flow_rows(file_path, date):
+    """
+    Một file FiinTrade => các dòng của bảng tổng hợp: "Ngày", "Ngành" + các cột giá trị kiểu số.
+    Giữ nguyên thứ tự cột trong file (khớp lệnh ở cột 1:5, thỏa thuận ở cột 6:10).
+    """
+    df = load_daily_flow_file(file_path)
+    df.columns = ["Ngành"] + _unique_columns(df.columns)[1:]
+    values = df.iloc[:, 1:].apply(pd.to_numeric, errors="coerce").astype("float64")
+    rows = pd.concat([df.iloc[:, [0]].astype(str), values], axis=1)
+    rows.insert(0, "Ngày", date)
+    return rows
+
+
+class TradingCalendar:
+    """
+    Lịch phiên giao dịch dựng từ các ngày thực sự có dữ liệu (file trong Data GD hoặc cột ngày của file giá).
+    D-N là N phiên trước đó (không phải N ngày lịch), tra vị trí O(1) qua dict ngày -> thứ tự phiên.
+    """
+
+    def __init__(self, dates):
+        self.dates = pd.DatetimeIndex(dates).dropna().unique().sort_values()
+        self.positions = {date: i for i, date in enumerate(self.dates)}
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __contains__(self, date):
+        return pd.Timestamp(date) in self.positions
+
+    def shift(self, date, sessions):
+        """
+        Ngày của phiên cách date `sessions` phiên về trước (sessions < 0 => về sau).
+        date không phải phiên giao dịch hoặc vượt ngoài lịch => None.
+        """
+        i = self.positions.get(pd.Timestamp(date))
+        if i is None or not 0 <= i - sessions < len(self.dates):
+            return None
+        return self.dates[i - sessions]
+
+    def lookback(self, date, sessions):
+        """
+        Danh sách ngày D-1 ... D-sessions của date (phần tử None nếu thiếu lịch sử).
+        """
+        return [self.shift(date, k) for k in range(1, sessions + 1)]
+
+
+def flow_split_ratios(totals, investors=INVESTOR_TYPES, order_types=ORDER_TYPES):
+    """
+    Tỷ lệ % |<loại NĐT> <loại lệnh> Ròng| / |<loại NĐT> Tổng GT Ròng| theo từng ngày (tổng Tổng GT = 0 => 0).
+    totals: bảng tổng theo ngày (index ngày, cột như trong file Data GD).
+    """
+    ratios = {}
+    for investor in investors:
+        total_col = f"{investor} Tổng GT Ròng"
+        if total_col not in totals:
+            continue
+        total = totals[total_col].abs()
+        for order_type in order_types:
+            col = f"{investor} {order_type} Ròng"
+            ratios[col] = (totals[col].abs() / total * 100).where(total != 0, 0.0)
+    return pd.DataFrame(ratios, index=totals.index)
+
+
+class DailyFlowStore:
+    """
+    Bảng tổng hợp mọi file trong thư mục Data GD, khóa (Ngày, Ngành).
+    - table: DataFrame có MultiIndex (Ngày, Ngành), các cột giá trị kiểu float theo đúng thứ tự trong file.
+    - dates: các ngày có dữ liệu (DatetimeIndex đã sắp xếp).
+    - calendar: TradingCalendar trên dates, dùng cho so sánh D-N theo phiên.
+    - totals: tổng toàn thị trường theo ngày của mọi cột (index ngày), tính sẵn một lần khi dựng bảng.
+    - split_ratios: tỷ lệ % khớp lệnh/thỏa thuận trên Tổng GT Ròng theo ngày (xem flow_split_ratios).
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.dates = pd.DatetimeIndex(table.index.get_level_values(0).unique()).sort_values()
+        self.calendar = TradingCalendar(self.dates)
+        self.totals = table.groupby(level=0).sum()
+        self.split_ratios = flow_split_ratios(self.totals)
+
+    @property
+    def nbytes(self):
+        return int(sum(df.memory_usage(deep=True).sum() for df in (self.table, self.totals, self.split_ratios)))
+
+    def has_date(self, date):
+        return pd.Timestamp(date) in self.dates
+
+    def for_date(self, date):
+        """
+        Dữ liệu một ngày, cùng dạng với load_daily_flow_file (cột "Ngành" + các cột giá trị).
+        Không có ngày đó => None.
+        """
+        date = pd.Timestamp(date)
+        if date not in self.dates:
+            return None
+        return self.table.xs(date, level=0).reset_index()
+
+    def cube(self, dates, columns):
+        """
+        Khối số liệu (ngày x ngành x cột) cho các ngày/cột cho trước.
+        Ngành lấy theo thứ tự của ngày đầu tiên; ngày khác thiếu ngành nào thì ô đó là NaN.
+        Trả về (sectors, ndarray float64 shape (len(dates), len(sectors), len(columns))).
+        """
+        dates = [pd.Timestamp(d) for d in dates]
+        sectors = self.table.loc[dates[0]].index
+        index = pd.MultiIndex.from_product([dates, sectors], names=self.table.index.names)
+        values = self.table.reindex(index=index, columns=list(columns)).to_numpy(dtype="float64")
+        return sectors, values.reshape(len(dates), len(sectors), len(columns))
+
+
+def _daily_flow_store_paths(folder):
+    stem = os.path.join(SNAPSHOT_DIR, "daily_flow-" + os.path.basename(os.path.abspath(folder)).replace(" ", "_"))
+    return stem + ".feather", stem + ".json"
+
+
+def update_daily_flow_store(folder=DAILY_FLOW_DIR, catalog=None):
+    """
+    Cập nhật bảng tổng hợp cho thư mục Data GD và ghi lại xuống .snapshot (nếu có pyarrow).
+    Chỉ đọc các file mới hoặc đã thay đổi (so theo mtime/size), file đã xóa thì bỏ khỏi bảng.
+    catalog: DailyFlowCatalog đã duyệt sẵn (None => duyệt thư mục).
+    """
+    table_path, manifest_path = _daily_flow_store_paths(folder)
+    table, manifest = None, {}
+    if feather is not None and os.path.exists(table_path) and os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            table = feather.read_table(table_path).to_pandas()
+        except (OSError, ValueError):
+            table, manifest = None, {}
+
+    files = {}
+    catalog = catalog if catalog is not None else load_daily_flow_catalog(folder)
+    for date, (path, size, mtime_ns) in catalog.entries.items():
+        files[os.path.basename(path)] = (date, [mtime_ns, size])
+
+    stale = {fname for fname, sig in manifest.items() if fname not in files or files[fname][1] != sig}
+    new_files = [fname for fname in files if fname not in manifest or fname in stale]
+    if table is not None and stale:
+        stale_dates = [daily_flow_date(fname) for fname in stale]
+        table = table[~table["Ngày"].isin(stale_dates)]
+
+    if new_files or table is None:
+        parts = [] if table is None else [table]
+        parts += [_read_daily_flow_rows(os.path.join(folder, fname), files[fname][0]) for fname in new_files]
+        table = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["Ngày", "Ngành"])
+        table["Ngày"] = pd.to_datetime(table["Ngày"])
+        table = table.sort_values("Ngày", kind="stable").reset_index(drop=True)
+        manifest = {fname: sig for fname, (_, sig) in files.items()}
+        if feather is not None:
+            try:
+                os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+                feather.write_feather(table, table_path + ".tmp")
+                os.replace(table_path + ".tmp", table_path)
+                with open(manifest_path, "w", encoding="utf-8") as f:
+                    json.dump(manifest, f, ensure_ascii=False)
+            except OSError:
+                pass
+    return table
+
+
+@cached_loader
+def _load_daily_flow_store(folder, signature):
+    """
+    DailyFlowStore cho một phiên bản (signature) của danh mục Data GD.
+    """
+    table = update_daily_flow_store(folder)
+    return DailyFlowStore(table.set_index(["Ngày", "Ngành"]))
+
+
+def load_daily_flow_store(folder=DAILY_FLOW_DIR):
+    """
+    DailyFlowStore của thư mục Data GD, có bộ nhớ đệm theo chữ ký (mtime, size) của từng file trong danh mục
+    => đọc lại khi có file mới, bị xóa hoặc bị ghi đè.
+    """
+    return _load_daily_flow_store(folder, load_daily_flow_catalog(folder).signature)
+
+
+def flow_change_frames(store, date, lookback, columns):
+    """
+    Chênh lệch D-1 ... D-lookback (theo phiên giao dịch) của nhiều cột cùng lúc:
+    lấy khối (1 + lookback) ngày x ngành x cột rồi trừ một lần bằng broadcast (hôm nay - từng phiên trước).
+    Trả về dict cột -> DataFrame (index "Ngành", cột "D-1" ... "D-N"); ngày không có hoặc thiếu lịch sử => None.
+    """
+    if date not in store.calendar:
+        return None
+    prev_dates = store.calendar.lookback(date, lookback)
+    if any(d is None for d in prev_dates):
+        return None
+    sectors, cube = store.cube([date] + prev_dates, columns)
+    changes = (cube[0] - cube[1:]).transpose(2, 1, 0)  # (cột, ngành, lookback)
+    labels = [f"D-{k}" for k in range(1, lookback + 1)]
+    return {col: pd.DataFrame(changes[i], index=sectors, columns=labels) for i, col in enumerate(columns)}
+
+
+##############################################
+# 5. Thư viện D3 cho biểu đồ HTML
+##############################################
+@cached_loader
+def _read_inline_script(file_path):
+    with open(file_path, encoding="utf-8") as f:
+        return f"<script>{f.read()}</script>"
+
+
+def load_d3_script(file_path=D3_FILE):
+    """
+    Thẻ <script> chứa D3 để nhúng vào HTML của components.html
+    (nhúng thẳng nội dung file cục bộ => không cần mạng, file chỉ đọc một lần).
+    Chưa có file (bản checkout mới) => tải về file_path một lần (setup.sh đã làm sẵn khi deploy);
+    không tải được => trả về None để dashboard báo lỗi.
+    """
+    if not os.path.exists(file_path):
+        _fetch_d3_once(file_path)
+    if os.path.exists(file_path):
+        return _read_inline_script(file_path)
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _fetch_d3_once(file_path):
+    """
+    Gọi fetch_d3 tối đa một lần cho mỗi file trong tiến trình (không có mạng => không thử lại mỗi lần vẽ).
+    """
+    try:
+        fetch_d3(file_path)
+        return True
+    except OSError:
+        return False
+
+
+def fetch_d3(file_path=D3_FILE, url=D3_CDN_URL):
+    """
+    Tải D3 về file_path (chạy một lần trên máy có mạng, sau đó copy cùng mã nguồn).
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = f"{file_path}.tmp"
+    urllib.request.urlretrieve(url, tmp_path)
+    os.replace(tmp_path, file_path)
+
+
+##############################################
+# 6. Dữ liệu phân cấp cho biểu đồ bong bóng
+##############################################
+@cached_loader
+def load_icb_table(file_path=ICB_FILE):
+    """
+    Bảng phân ngành (Phan_loai_nganh.xlsx) với "Mã", "Sàn" và mọi cột "Ngành ICB - cấp N"
+    ở dạng Categorical theo danh mục chung ("Mã" dùng chung danh mục với cột symbol của bảng giá).
+    Bảng thô đọc thẳng từ snapshot, không giữ thêm một bản trong bộ nhớ đệm.
+    """
+    df = load_workbook.__wrapped__(file_path)
+    columns = {col: "symbol" if col == "Mã" else col for col in df.columns
+               if col in ("Mã", "Sàn") or str(col).startswith("Ngành ICB - cấp")}
+    return categorize_columns(df, columns)
+
+
+def attach_icb_levels(df, levels=ICB_LEVELS, file_path=ICB_FILE, symbol_col="symbol"):
+    """
+    Gắn các cấp ngành ICB (từ Phan_loai_nganh.xlsx, khớp theo cột "Mã") vào df.
+    Mã không có trong file phân ngành => NaN ở các cột ngành.
+    """
+    df_icb = load_icb_table(file_path)[["Mã"] + list(levels)]
+    df_icb = df_icb.drop_duplicates("Mã").rename(columns={"Mã": symbol_col})
+    # Hai bên cùng danh mục mã mới nhất => merge trên codes, cột ngành giữ kiểu Categorical
+    df = categorize_columns(df, {symbol_col: "symbol"})
+    df_icb = categorize_columns(df_icb, {symbol_col: "symbol"})
+    return df.merge(df_icb, on=symbol_col, how="left")
+
+
+def _json_value(value):
+    """
+    Giá trị JSON giống json.dumps(value, ensure_ascii=False), nhanh hơn cho chuỗi và số thực.
+    """
+    if isinstance(value, str):
+        return json.encoder.encode_basestring(value)
+    if type(value) is float and math.isfinite(value):
+        return float.__repr__(value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def iter_hierarchy_json(df, levels=("sector",), name_col="symbol", value_col="volume",
+                        extra_cols=("PriceChange", "volume"), root_name="Toàn thị trường"):
+    """
+    Sinh từng đoạn chuỗi JSON của cây: gốc -> levels[0] -> ... -> levels[-1] -> từng mã (lá).
+    - Chỉ sắp xếp một lần theo đường dẫn nhóm rồi ghi thẳng ra chuỗi, không dựng dict/list trung gian.
+    - Nhóm và mã giữ thứ tự xuất hiện trong df; dòng thiếu giá trị ở một cấp bất kỳ bị bỏ.
+    - Lá: {"name", "value" (= value_col), <extra_cols>}; NaN ở extra_cols => 0.
+    """
+    levels = list(levels)
+    df = df.dropna(subset=levels)
+    n_rows, n_levels = len(df), len(levels)
+
+    yield '{"name": ' + _json_value(root_name) + ', "children": ['
+    if n_rows == 0:
+        yield "]}"
+        return
+
+    # Mã nhóm của đường dẫn (cấp 1, ..., cấp k) theo thứ tự xuất hiện => sắp xếp ổn định theo đường dẫn
+    path_codes = [df.groupby(levels[:k + 1], sort=False, observed=True).ngroup().to_numpy() for k in range(n_levels)]
+    order = np.lexsort(path_codes[::-1])
+    path_codes = np.stack([codes[order] for codes in path_codes])
+
+    # Cấp đầu tiên đổi nhóm so với dòng trước (n_levels = vẫn cùng nhóm lá)
+    changed = path_codes[:, 1:] != path_codes[:, :-1]
+    first_change = np.zeros(n_rows, dtype=int)
+    first_change[1:] = np.where(changed.any(axis=0), changed.argmax(axis=0), n_levels)
+
+    level_values = [df[level].to_numpy()[order].tolist() for level in levels]
+    names = df[name_col].to_numpy()[order].tolist()
+    values = df[value_col].to_numpy(dtype=float)[order].tolist()
+    extras = [df[col].to_numpy(dtype=float)[order].tolist() for col in extra_cols]
+
+    for i in range(n_rows):
+        depth = first_change[i]
+        if i > 0:
+            yield "]}" * (n_levels - depth) + ", "
+        for k in range(depth, n_levels):
+            yield '{"name": ' + _json_value(level_values[k][i]) + ', "children": ['
+        leaf = '{"name": ' + _json_value(names[i]) + ', "value": ' + _json_value(values[i])
+        for col, column_values in zip(extra_cols, extras):
+            value = column_values[i]
+            leaf += ", " + _json_value(col) + ": " + (_json_value(value) if value == value else "0")
+        yield leaf + "}"
+    yield "]}" * n_levels + "]}"
+
+
+def hierarchy_json(df, levels=("sector",), **kwargs):
+    """
+    Chuỗi JSON cây phân cấp cho d3.hierarchy (xem iter_hierarchy_json).
+    """
+    return "".join(iter_hierarchy_json(df, levels, **kwargs))
+
+
+##############################################
+# 7. Thống kê dòng tiền theo loại nhà đầu tư (VNINDEX)
+##############################################
+@cached_loader
+def load_flow_statistics(file_path=FLOW_STATS_FILE, investors=FLOW_STATS_INVESTORS):
+    """
+    Bảng rộng theo ngày từ các sheet "<loại NĐT> (Ròng)", mở workbook một lần cho mọi sheet.
+    - Chỉ đọc cột Ngày + các cột trong FLOW_STATS_COLUMNS (chọn ngay lúc parse).
+    - Các sheet được căn theo index ngày chung (pd.concat) thay cho nhiều lần merge outer.
+    Trả về DataFrame index "Ngày" (đã sắp xếp), cột MultiIndex ("Nhà đầu tư", "Loại"), VD ("Cá nhân trong nước", "Khớp")
+    => melt ra thẳng hai cột "Nhà đầu tư", "Loại", không phải tách chuỗi tên cột.
+    """
+    wanted = {"Ngày", *FLOW_STATS_COLUMNS}
+    sheets = pd.read_excel(file_path, sheet_name=[f"{investor} (Ròng)" for investor in investors],
+                           usecols=lambda c: c in wanted)
+    frames = []
+    for investor in investors:
+        df = sheets[f"{investor} (Ròng)"]
+        df = df.set_index(pd.to_datetime(df["Ngày"], errors="coerce"))[list(FLOW_STATS_COLUMNS)]
+        df.columns = pd.MultiIndex.from_tuples([(investor, FLOW_STATS_COLUMNS[c]) for c in df.columns],
+                                               names=["Nhà đầu tư", "Loại"])
+        frames.append(df[df.index.notna()])
+    return pd.concat(frames, axis=1).sort_index().rename_axis("Ngày")
+
+
+if __name__ == "__main__":
+    ingest_workbooks()
+    if "--memory" in sys.argv[1:]:
+        # Nạp các bảng chính như dashboard rồi in dung lượng từng bảng
+        load_date_frame(PRICE_FILE, "float32")
+        load_panel(PRICE_FILE, "price")
+        load_price_indicators(PRICE_FILE)
+        load_panel(VOLUME_FILE, "Volume", "integer")
+        load_range_sum(VOLUME_FILE)
+        load_date_frame(MARKETCAP_FILE)
+        memory_report()
+    if not os.path.exists(D3_FILE):
+        try:
+            fetch_d3()
+            print(f"{D3_FILE}: đã tải từ {D3_CDN_URL}")
+        except OSError as e:
+            print(f"{D3_FILE}: không tải được ({e}), biểu đồ bong bóng sẽ không hiển thị cho tới khi có file này")
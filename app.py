@@ -4,29 +4,21 @@ import plotly.graph_objects as go
 import streamlit as st
 from plotly.subplots import make_subplots
 
-# Helper functions for technical indicators
-def calculate_macd(df):
-    short_ema = df["Price Close"].ewm(span=12, adjust=False).mean()
-    long_ema = df["Price Close"].ewm(span=26, adjust=False).mean()
-    df["MACD"] = short_ema - long_ema
-    df["Signal Line"] = df["MACD"].ewm(span=9, adjust=False).mean()
-    return df
-
-def calculate_rsi(df, period=14):
-    delta = df["Price Close"].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-    rs = gain / loss
-    df["RSI"] = 100 - (100 / (1 + rs))
-    return df
+import Dashboard_Functions as functions
 
+@st.cache_data
 def load_data(file_path):
-    df = pd.read_csv(file_path)
+    df = pd.read_csv(file_path, dtype={"Ticker": "category"})
     # Convert 'Date' column to datetime
     df['Date'] = pd.to_datetime(df['Date'], format='%d/%m/%Y')
     df.sort_values(by=["Ticker", "Date"], inplace=True)
     return df
 
+# Technical indicators for every ticker, computed once per file in a grouped pass
+@st.cache_data
+def load_indicators(file_path):
+    return functions.get_indicators(load_data(file_path), group_by="Ticker")
+
 # Initialize Streamlit app
 st.markdown('''
 # Financial Dashboard Application
@@ -74,9 +66,8 @@ else:
     st.markdown(f"## {ticker} - Price Data")
     st.dataframe(filtered_data)
 
-    # Add technical indicators
-    filtered_data = calculate_macd(filtered_data)
-    filtered_data = calculate_rsi(filtered_data)
+    # Technical indicators are precomputed on the full history of every ticker
+    filtered_data = load_indicators(DATA_FILE).loc[filtered_data.index]
 
     # Create subplots
     fig = make_subplots(
@@ -116,7 +107,7 @@ else:
     fig.add_trace(
         go.Scatter(
             x=filtered_data["Date"],
-            y=filtered_data["Signal Line"],
+            y=filtered_data["Signal"],
             line=dict(color="red", width=1),
             name="Signal Line",
         ),
@@ -128,7 +119,7 @@ else:
     fig.add_trace(
         go.Scatter(
             x=filtered_data["Date"],
-            y=filtered_data["RSI"],
+            y=filtered_data["RSI-SMA"],
             line=dict(color="purple", width=1),
             name="RSI",
         ),
@@ -7,3 +7,6 @@ enableCORS = false\n\
 headless = true\n\
 \n\
 " > ~/.streamlit/config.toml
+
+# Tải sẵn D3 cho biểu đồ bong bóng (static/d3.v7.min.js) và chuyển các file Excel sang snapshot
+python Data_Functions.py || true
@@ -1,148 +1,120 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import datetime, os, json
+import datetime
 import plotly.express as px
-import plotly.graph_objects as go
 import streamlit.components.v1 as components
 
+import Data_Functions as data_functions
+import Dashboard_Functions as functions
+
+# Số điểm tối đa mỗi đường/cột gửi xuống trình duyệt (theo bề rộng biểu đồ, xem functions.downsample_lttb/downsample_bars)
+MAX_CHART_POINTS = functions.get_max_points()
+
 
 ##############################################
 # 1. Hàm tải dữ liệu chung từ file Excel
 ##############################################
 def load_data_for_date(date_str):
     """
-    Tải dữ liệu từ file Excel dựa trên chuỗi ngày đã nhập (YYYYMMDD).
-    File được đọc từ dòng 8 đến dòng 27 (bỏ qua 7 dòng đầu, chỉ lấy 20 dòng).
-    Dòng đầu (dòng 8) làm header, sau đó loại bỏ đuôi "L2" ở cột A nếu có.
+    Tra dữ liệu ngày date_str (YYYYMMDD) trong bảng tổng hợp thư mục Data GD
+    (mọi file chỉ đọc một lần, xem data_functions.load_daily_flow_store).
+    Trả về DataFrame cột "Ngành" + các cột giá trị, cùng thứ tự cột như trong file Excel.
     """
-    file_path = f"Data GD/FiinTrade_Ngành-chuyên-sâu_Phân-Loại-Nhà-Đầu-Tư__1 NGÀY_{date_str}.xlsx"
-    if not os.path.exists(file_path):
-        st.error(f"File không tồn tại: {file_path}")
-        return None
+    file_path = data_functions.daily_flow_path(date_str)
     try:
-        df_temp = pd.read_excel(file_path, header=None, skiprows=7, nrows=20)
-        df_temp.iloc[:, 0] = df_temp.iloc[:, 0].astype(str).str.replace(r'\s*L2$', '', regex=True)
-        df_temp.columns = df_temp.iloc[0]
-        df = df_temp[1:].reset_index(drop=True)
-        return df
+        df = data_functions.load_daily_flow_store().for_date(pd.to_datetime(date_str, format="%Y%m%d"))
     except Exception as e:
         st.error(f"Lỗi khi đọc file: {e}")
         return None
+    if df is None:
+        st.error(f"File không tồn tại: {file_path}")
+    return df
+
 
+# Tên dòng vốn trong tiêu đề heatmap theo từng loại nhà đầu tư
+FLOW_HEATMAP_TITLES = {
+    "Nước ngoài": "dòng vốn nước ngoài",
+    "Tự doanh": "dòng vốn tự doanh",
+    "Tổ chức trong nước": "Tổ chức trong nước Tổng GT Ròng",
+    "Cá nhân": "Cá nhân Tổng GT Ròng",
+}
 
-def get_offset_date_str(date_str, offset_days):
+
+def plot_flow_split_pie(ratios, investor):
     """
-    Trả về chuỗi ngày (YYYYMMDD) sau khi trừ đi offset_days.
+    Pie chart tỷ lệ % giữa <investor> Khớp Ròng và <investor> Thỏa thuận Ròng của một ngày
+    (ratios: một dòng của bảng split_ratios tính sẵn trong Data_Functions).
     """
-    date_obj = datetime.datetime.strptime(date_str, "%Y%m%d").date()
-    new_date = date_obj - datetime.timedelta(days=offset_days)
-    return new_date.strftime("%Y%m%d")
+    names = [f"{investor} {order_type} Ròng" for order_type in data_functions.ORDER_TYPES]
+    data_pie = {
+        "Loại": names,
+        "Tỷ lệ (%)": [ratios[name] for name in names]
+    }
+    return px.pie(data_pie, values="Tỷ lệ (%)", names="Loại", title=f"Tỷ lệ % giữa {names[0]} và {names[1]}",
+                  hole=0.3)
+
+
+def plot_flow_split_trend(ratios):
+    """
+    Xu hướng tỷ lệ % Khớp Ròng trên Tổng GT Ròng của từng loại nhà đầu tư qua các phiên.
+    """
+    columns = {f"{investor} Khớp Ròng": investor for investor in data_functions.INVESTOR_TYPES}
+    df_plot = ratios[list(columns)].rename(columns=columns).rename_axis("Ngày").reset_index().melt(
+        id_vars="Ngày",
+        var_name="Nhà đầu tư",
+        value_name="Tỷ lệ (%)"
+    )
+    fig = px.line(df_plot, x="Ngày", y="Tỷ lệ (%)", color="Nhà đầu tư", markers=True,
+                  title="Xu hướng tỷ lệ % Khớp Ròng trên Tổng GT Ròng theo phiên")
+    fig.update_xaxes(type="category")
+    return fig
 
 
 ##############################################
 # 2. Các hàm bổ trợ cho biểu đồ "Biều đồ về giá của từng cổ phiếu"
 ##############################################
-def parse_mixed_date(date_str):
+def load_circle_packing_data(df_price, vol_sums, start_date, end_date):
     """
-    Thử parse date_str bằng dayfirst=True (dd/mm/yyyy).
-    Nếu lỗi, parse dayfirst=False (mm/dd/yyyy).
-    => Ưu tiên dd/mm.
+    df_price: bảng giá đã parse cột ngày (data_functions.load_date_frame).
+    vol_sums: tổng lũy kế của bảng volume (data_functions.load_range_sum).
     """
-    # Bước 1: thử dayfirst=True
-    try:
-        dt = pd.to_datetime(date_str, dayfirst=True, errors='raise')
-        # parse thành công => trả về
-        return dt
-    except:
-        pass
-
-    # Bước 2: fallback dayfirst=False
-    try:
-        dt = pd.to_datetime(date_str, dayfirst=False, errors='raise')
-        return dt
-    except:
-        return pd.NaT
-
-def load_circle_packing_data(price_file, volume_file, start_date, end_date):
-    df_price = pd.read_excel(price_file)
-    # Parse cột ngày
-    df_price.columns = (
-            ["symbol", "sector"]
-            + pd.to_datetime(
-        df_price.columns[2:],
-        format="%d/%m/%Y",
-        dayfirst=True,
-        errors="coerce"
-    ).strftime("%Y-%m-%d").tolist()
-    )
-
     start_date_str = start_date.strftime("%Y-%m-%d")
     end_date_str = end_date.strftime("%Y-%m-%d")
 
-    if start_date_str not in df_price.columns or end_date_str not in df_price.columns:
+    if start_date not in df_price.columns or end_date not in df_price.columns:
         raise ValueError(
             f"Không tìm thấy cột {start_date_str} hoặc {end_date_str} trong dữ liệu giá!")
 
-    df_price = df_price[["symbol", "sector", start_date_str, end_date_str]].copy()
+    df_price = df_price[["symbol", "sector", start_date, end_date]].copy()
+    # Giá lưu float32 => về float64 đúng số trong file trước khi tính % thay đổi
+    for col in (start_date, end_date):
+        df_price[col] = data_functions.exact_float64(df_price[col])
     df_price["PriceChange"] = (
-            (df_price[end_date_str] - df_price[start_date_str])
-            / df_price[start_date_str]
+            (df_price[end_date] - df_price[start_date])
+            / df_price[start_date]
             * 100
     )
 
-    df_vol = pd.read_excel(volume_file)
-    df_vol.columns = (
-            ["symbol", "sector"]
-            + pd.to_datetime(
-        df_vol.columns[2:],
-        format="%d/%m/%Y",
-        dayfirst=True,
-        errors="coerce"
-    ).strftime("%Y-%m-%d").tolist()
-    )
-
-    if start_date_str not in df_vol.columns or end_date_str not in df_vol.columns:
+    if start_date not in vol_sums.dates or end_date not in vol_sums.dates:
         raise ValueError(
             f"Không tìm thấy cột {start_date_str} hoặc {end_date_str} trong dữ liệu volume!")
 
-    date_cols_vol = [c for c in df_vol.columns[2:] if start_date_str <= c <= end_date_str]
-    df_vol["volume"] = df_vol[date_cols_vol].sum(axis=1)
-    df_vol = df_vol[["symbol", "sector", "volume"]]
+    # Tổng volume trong khoảng ngày = hiệu hai cột lũy kế
+    df_vol = vol_sums.frame(start_date, end_date, "volume")
 
     df_merged = pd.merge(df_price, df_vol, on=["symbol", "sector"], how="inner")
     df_final = df_merged[["symbol", "sector", "volume", "PriceChange"]]
     return df_final
 
-def build_hierarchical_data(df_final):
-    root = {"name": "Toàn thị trường", "children": []}
-    unique_sectors = df_final["sector"].dropna().unique().tolist()
-
-    for sec in unique_sectors:
-        df_ind = df_final[df_final["sector"] == sec]
-        children_stocks = []
-        for _, row in df_ind.iterrows():
-            children_stocks.append({
-                "name": row["symbol"],
-                "value": float(row["volume"]),
-                "PriceChange": float(row["PriceChange"]) if not pd.isna(
-                    row["PriceChange"]) else 0,
-                "volume": float(row["volume"])
-            })
-        root["children"].append({
-            "name": sec,
-            "children": children_stocks
-        })
-    return root
-
-def generate_circle_packing_html(hierarchical_data_json):
+def generate_circle_packing_html(hierarchical_data_json, d3_script):
     chart_width = 450
     chart_height = 450
     html_code = f"""
     <html>
     <head>
         <meta charset="utf-8">
-        <script src="https://d3js.org/d3.v7.min.js"></script>
+        {d3_script}
         <style>
             body {{
                 margin: 0;
@@ -207,7 +179,7 @@ def generate_circle_packing_html(hierarchical_data_json):
                 .attr("fill", function(d) {{
                     if(d.depth === 0) {{
                         return "#f0f0f0";
-                    }} else if(d.depth === 1) {{
+                    }} else if(d.children) {{
                         return "#add8e6";
                     }} else {{
                         return (d.data.PriceChange >= 0) ? "#2ecc71" : "#e74c3c";
@@ -245,6 +217,32 @@ def generate_circle_packing_html(hierarchical_data_json):
     return html_code
 
 
+@data_functions.cached_loader
+def load_circle_packing_chart(price_file, volume_file, start_date, end_date, levels=("sector",),
+                              d3_file=data_functions.D3_FILE):
+    """
+    Bảng dữ liệu + HTML biểu đồ bong bóng cho khoảng (start_date, end_date).
+    Cache theo (file giá, file volume, ngày bắt đầu, ngày kết thúc) => vẽ lại cùng khoảng ngày không tốn gì.
+    levels: các cấp nhóm bong bóng, VD ("sector",) hoặc data_functions.ICB_LEVELS (ngành ICB cấp 1 -> 3).
+    d3_file: file D3 cục bộ, nằm trong khóa cache (kèm mtime/size) => khi file được thêm/đổi, HTML được tạo lại.
+    HTML = None nếu chưa có file D3.
+    """
+    df_final = load_circle_packing_data(
+        data_functions.load_date_frame(price_file, "float32"),
+        data_functions.load_range_sum(volume_file),
+        start_date,
+        end_date
+    )
+    df_final = df_final.sort_values(by=["sector", "volume", "PriceChange"], ascending=[False, False, False])
+    if tuple(levels) != ("sector",):
+        df_final = data_functions.attach_icb_levels(df_final, levels)
+    json_data = data_functions.hierarchy_json(df_final, levels)
+    d3_script = data_functions.load_d3_script(d3_file)
+    if d3_script is None:
+        return df_final, None
+    return df_final, generate_circle_packing_html(json_data, d3_script)
+
+
 #-----------------Hàm cho mục thống kê giao dịch trong và ngoài nước
 # def get_file_date(filename):
 #     """
@@ -305,7 +303,8 @@ def main():
     if dashboard_option == "Phân loại ngành":
         st.markdown("### Hiển thị thống kê các ngành trong thị trường chứng khoán")
         file_path = "Phan_loai_nganh.xlsx"
-        df = pd.read_excel(file_path)
+        # Mã, Sàn, Ngành ICB - cấp N ở dạng Categorical => lọc isin trên codes
+        df = data_functions.load_icb_table(file_path)
         if "STT" in df.columns:
             df = df.drop("STT", axis=1)
 
@@ -344,7 +343,7 @@ def main():
 
         # --- Biểu đồ cho Sàn: dạng cột, chiếm một hàng ---
         if "Sàn" in filtered_df.columns:
-            counts = filtered_df["Sàn"].value_counts()
+            counts = filtered_df["Sàn"].cat.remove_unused_categories().value_counts()
             fig = px.bar(
                 x=counts.index,
                 y=counts.values,
@@ -370,7 +369,7 @@ def main():
                     col_field, title = icb_chart_columns[i + j]
                     if col_field in filtered_df.columns:
                         if col_field in ["Ngành ICB - cấp 3", "Ngành ICB - cấp 4"]:
-                            counts = filtered_df[col_field].value_counts()
+                            counts = filtered_df[col_field].cat.remove_unused_categories().value_counts()
                             total = counts.sum()
                             large = counts[counts / total * 100 >= 3]
                             small = counts[counts / total * 100 < 3]
@@ -379,7 +378,7 @@ def main():
                             final_counts = large
                             fig = px.pie(values=final_counts.values, names=final_counts.index, title=title, hole=0.3)
                         else:
-                            counts = filtered_df[col_field].value_counts()
+                            counts = filtered_df[col_field].cat.remove_unused_categories().value_counts()
                             fig = px.pie(values=counts.values, names=counts.index, title=title, hole=0.3)
                         fig.update_layout(**chart_layout)
                         cols[j].plotly_chart(fig, use_container_width=True)
@@ -390,7 +389,7 @@ def main():
     elif dashboard_option == "Vốn hóa của cổ phiếu và thị trường":
         st.write("Hiển thị sự tăng trưởng vốn hóa của từng cổ phiếu và mức độ phân bổ vốn hóa của thị trường.")
         file_path = "Vietnam_Marketcap(Final).xlsx"
-        df_marketcap = pd.read_excel(file_path)
+        df_marketcap = data_functions.categorize_columns(data_functions.load_workbook(file_path), {"symbol": "symbol"})
         st.dataframe(df_marketcap)
 
         st.subheader("Biểu đồ Line: Thay đổi vốn hóa của cổ phiếu")
@@ -463,255 +462,65 @@ def main():
             st.error("Ngày nhập không hợp lệ! Vui lòng nhập theo định dạng YYYYMMDD.")
             return
 
+        lookback = st.sidebar.slider("Số phiên so sánh (D-1 ... D-N):", min_value=1, max_value=20, value=4,
+                                     key="txn_lookback")
+
+        investors = st.sidebar.multiselect("Heatmap theo loại nhà đầu tư:", list(data_functions.INVESTOR_TYPES),
+                                           default=list(data_functions.INVESTOR_TYPES), key="txn_investors")
+
         df_today = load_data_for_date(date_str)
-        df_d1 = load_data_for_date(get_offset_date_str(date_str, 1))
-        df_d2 = load_data_for_date(get_offset_date_str(date_str, 2))
-        df_d3 = load_data_for_date(get_offset_date_str(date_str, 3))
-        df_d4 = load_data_for_date(get_offset_date_str(date_str, 4))
+        flow_changes = None
+        if df_today is not None:
+            # Chênh lệch Tổng GT Ròng của mọi loại nhà đầu tư đã chọn, mọi D-k, tính một lần
+            flow_changes = data_functions.flow_change_frames(
+                data_functions.load_daily_flow_store(), pd.Timestamp(current_date), lookback,
+                [f"{investor} Tổng GT Ròng" for investor in investors])
+            if flow_changes is None:
+                st.error(f"Không đủ {lookback} phiên giao dịch trước ngày {date_str} trong thư mục Data GD!")
 
-        if df_today is not None and df_d1 is not None and df_d2 is not None and df_d3 is not None and df_d4 is not None:
+        if flow_changes is not None:
 
             #-----------------------------------------HEATMAP--------------------------------------------
 
-            # --- Heatmap cho "Nước ngoài Tổng GT Ròng" ---
-
-            result = pd.DataFrame()
-            result["Ngành"] = df_today["Ngành"].values
-            result["D-1"] = df_today["Nước ngoài Tổng GT Ròng"].astype(float) - df_d1["Nước ngoài Tổng GT Ròng"].astype(
-                float)
-            result["D-2"] = df_today["Nước ngoài Tổng GT Ròng"].astype(float) - df_d2["Nước ngoài Tổng GT Ròng"].astype(
-                float)
-            result["D-3"] = df_today["Nước ngoài Tổng GT Ròng"].astype(float) - df_d3["Nước ngoài Tổng GT Ròng"].astype(
-                float)
-            result["D-4"] = df_today["Nước ngoài Tổng GT Ròng"].astype(float) - df_d4["Nước ngoài Tổng GT Ròng"].astype(
-                float)
-            df_heatmap = result.set_index("Ngành")[["D-1", "D-2", "D-3", "D-4"]]
-            z = df_heatmap.values
-            limit = max(abs(z.min()), abs(z.max()))
-            colorscale = [
-                [0.0, "rgba(255,0,0,0.7)"],
-                [0.5, "rgba(255,255,255,0.7)"],
-                [1.0, "rgba(0,255,0,0.7)"]
-            ]
-            heatmap = go.Heatmap(
-                z=df_heatmap.values,
-                x=df_heatmap.columns,
-                y=df_heatmap.index,
-                colorscale=colorscale,
-                zmin=-limit,
-                zmax=limit,
-                hoverongaps=False,
-                text=df_heatmap.values,
-                texttemplate="%{text:.2f}",
-                textfont={"size": 12}
-            )
-            fig = go.Figure(data=[heatmap])
-            date_obj = datetime.datetime.strptime(date_str, "%Y%m%d").date()
-            date_final = date_obj.strftime("%d/%m/%y")
-            fig.update_layout(
-                title={
-                    'text': f"Tổng hợp sự thay đổi về dòng vốn nước ngoài tại thời điểm {date_final}",
-                    'x': 0.5,
-                    'xanchor': 'center'
-                },
-                xaxis_title="<b>Sự thay đổi về giá so với từng thời điểm</b>",
-                yaxis_title="<b>Ngành</b>",
-                margin=dict(l=40, r=40, t=50, b=40),
-                paper_bgcolor="rgba(0,0,0,0)",
-                plot_bgcolor="rgba(0,0,0,0)",
-                font=dict(color="white")
-            )
-            fig.update_xaxes(tickangle=0, automargin=True)
-            fig.update_yaxes(automargin=True)
-            st.markdown("<br>", unsafe_allow_html=True)
-            st.plotly_chart(fig, use_container_width=True)
-
-            # --- Heatmap cho "Tự doanh Tổng GT Ròng" ---
-            st.markdown("### Heatmap: Thay đổi về Tự doanh Tổng GT Ròng")
-            result_td = pd.DataFrame()
-            result_td["Ngành"] = df_today["Ngành"].values
-            result_td["D-1"] = df_today["Tự doanh Tổng GT Ròng"].astype(float) - df_d1["Tự doanh Tổng GT Ròng"].astype(
-                float)
-            result_td["D-2"] = df_today["Tự doanh Tổng GT Ròng"].astype(float) - df_d2["Tự doanh Tổng GT Ròng"].astype(
-                float)
-            result_td["D-3"] = df_today["Tự doanh Tổng GT Ròng"].astype(float) - df_d3["Tự doanh Tổng GT Ròng"].astype(
-                float)
-            result_td["D-4"] = df_today["Tự doanh Tổng GT Ròng"].astype(float) - df_d4["Tự doanh Tổng GT Ròng"].astype(
-                float)
-            df_heatmap_td = result_td.set_index("Ngành")[["D-1", "D-2", "D-3", "D-4"]]
-            z_td = df_heatmap_td.values
-            limit_td = max(abs(z_td.min()), abs(z_td.max()))
-            heatmap_td = go.Heatmap(
-                z=df_heatmap_td.values,
-                x=df_heatmap_td.columns,
-                y=df_heatmap_td.index,
-                colorscale=colorscale,
-                zmin=-limit_td,
-                zmax=limit_td,
-                hoverongaps=False,
-                text=df_heatmap_td.values,
-                texttemplate="%{text:.2f}",
-                textfont={"size": 12}
-            )
-            fig_td = go.Figure(data=[heatmap_td])
-            fig_td.update_layout(
-                title={
-                    'text': f"Tổng hợp sự thay đổi về dòng vốn tự doanh tại thời điểm {date_final}",
-                    'x': 0.5,
-                    'xanchor': 'center'
-                },
-                xaxis_title="<b>Sự thay đổi về giá so với từng thời điểm</b>",
-                yaxis_title="<b>Ngành</b>",
-                margin=dict(l=40, r=40, t=50, b=40),
-                paper_bgcolor="rgba(0,0,0,0)",
-                plot_bgcolor="rgba(0,0,0,0)",
-                font=dict(color="white")
-            )
-            fig_td.update_xaxes(tickangle=0, automargin=True)
-            fig_td.update_yaxes(automargin=True)
-            st.markdown("<br>", unsafe_allow_html=True)
-            st.plotly_chart(fig_td, use_container_width=True)
-
-            # --- Heatmap cho "Tổ chức trong nước Tổng GT Ròng" ---
-            st.markdown("### Heatmap: Thay đổi về Tổ chức trong nước Tổng GT Ròng")
-            result_org = pd.DataFrame()
-            result_org["Ngành"] = df_today["Ngành"].values
-            result_org["D-1"] = df_today["Tổ chức trong nước Tổng GT Ròng"].astype(float) - df_d1[
-                "Tổ chức trong nước Tổng GT Ròng"].astype(float)
-            result_org["D-2"] = df_today["Tổ chức trong nước Tổng GT Ròng"].astype(float) - df_d2[
-                "Tổ chức trong nước Tổng GT Ròng"].astype(float)
-            result_org["D-3"] = df_today["Tổ chức trong nước Tổng GT Ròng"].astype(float) - df_d3[
-                "Tổ chức trong nước Tổng GT Ròng"].astype(float)
-            result_org["D-4"] = df_today["Tổ chức trong nước Tổng GT Ròng"].astype(float) - df_d4[
-                "Tổ chức trong nước Tổng GT Ròng"].astype(float)
-            df_heatmap_org = result_org.set_index("Ngành")[["D-1", "D-2", "D-3", "D-4"]]
-            z_org = df_heatmap_org.values
-            limit_org = max(abs(z_org.min()), abs(z_org.max()))
-            heatmap_org = go.Heatmap(
-                z=df_heatmap_org.values,
-                x=df_heatmap_org.columns,
-                y=df_heatmap_org.index,
-                colorscale=colorscale,
-                zmin=-limit_org,
-                zmax=limit_org,
-                hoverongaps=False,
-                text=df_heatmap_org.values,
-                texttemplate="%{text:.2f}",
-                textfont={"size": 12}
-            )
-            fig_org = go.Figure(data=[heatmap_org])
-            fig_org.update_layout(
-                title={
-                    'text': f"Tổng hợp sự thay đổi về Tổ chức trong nước Tổng GT Ròng tại thời điểm {date_final}",
-                    'x': 0.5,
-                    'xanchor': 'center'
-                },
-                xaxis_title="<b>Sự thay đổi về giá so với từng thời điểm</b>",
-                yaxis_title="<b>Ngành</b>",
-                margin=dict(l=40, r=40, t=50, b=40),
-                paper_bgcolor="rgba(0,0,0,0)",
-                plot_bgcolor="rgba(0,0,0,0)",
-                font=dict(color="white")
-            )
-            fig_org.update_xaxes(tickangle=0, automargin=True)
-            fig_org.update_yaxes(automargin=True)
-            st.markdown("<br>", unsafe_allow_html=True)
-            st.plotly_chart(fig_org, use_container_width=True)
-
-            # --- Heatmap cho "Cá nhân Tổng GT Ròng" ---
-            st.markdown("### Heatmap: Thay đổi về Cá nhân Tổng GT Ròng")
-            result_ind = pd.DataFrame()
-            result_ind["Ngành"] = df_today["Ngành"].values
-            result_ind["D-1"] = df_today["Cá nhân Tổng GT Ròng"].astype(float) - df_d1["Cá nhân Tổng GT Ròng"].astype(
-                float)
-            result_ind["D-2"] = df_today["Cá nhân Tổng GT Ròng"].astype(float) - df_d2["Cá nhân Tổng GT Ròng"].astype(
-                float)
-            result_ind["D-3"] = df_today["Cá nhân Tổng GT Ròng"].astype(float) - df_d3["Cá nhân Tổng GT Ròng"].astype(
-                float)
-            result_ind["D-4"] = df_today["Cá nhân Tổng GT Ròng"].astype(float) - df_d4["Cá nhân Tổng GT Ròng"].astype(
-                float)
-            df_heatmap_ind = result_ind.set_index("Ngành")[["D-1", "D-2", "D-3", "D-4"]]
-            z_ind = df_heatmap_ind.values
-            limit_ind = max(abs(z_ind.min()), abs(z_ind.max()))
-            heatmap_ind = go.Heatmap(
-                z=df_heatmap_ind.values,
-                x=df_heatmap_ind.columns,
-                y=df_heatmap_ind.index,
-                colorscale=colorscale,
-                zmin=-limit_ind,
-                zmax=limit_ind,
-                hoverongaps=False,
-                text=df_heatmap_ind.values,
-                texttemplate="%{text:.2f}",
-                textfont={"size": 12}
-            )
-            fig_ind = go.Figure(data=[heatmap_ind])
-            fig_ind.update_layout(
-                title={
-                    'text': f"Tổng hợp sự thay đổi về Cá nhân Tổng GT Ròng tại thời điểm {date_final}",
-                    'x': 0.5,
-                    'xanchor': 'center'
-                },
-                xaxis_title="<b>Sự thay đổi về giá so với từng thời điểm</b>",
-                yaxis_title="<b>Ngành</b>",
-                margin=dict(l=40, r=40, t=50, b=40),
-                paper_bgcolor="rgba(0,0,0,0)",
-                plot_bgcolor="rgba(0,0,0,0)",
-                font=dict(color="white")
-            )
-            fig_ind.update_xaxes(tickangle=0, automargin=True)
-            fig_ind.update_yaxes(automargin=True)
-            st.markdown("<br>", unsafe_allow_html=True)
-            st.plotly_chart(fig_ind, use_container_width=True)
+            # --- Heatmap "<loại nhà đầu tư> Tổng GT Ròng" ---
+            date_final = current_date.strftime("%d/%m/%y")
+            for investor in investors:
+                st.markdown(f"### Heatmap: Thay đổi về {investor} Tổng GT Ròng")
+                fig = functions.plot_flow_heatmap(
+                    flow_changes[f"{investor} Tổng GT Ròng"],
+                    f"Tổng hợp sự thay đổi về {FLOW_HEATMAP_TITLES[investor]} tại thời điểm {date_final}",
+                    x_title="<b>Sự thay đổi về giá so với từng thời điểm</b>",
+                    y_title="<b>Ngành</b>")
+                st.markdown("<br>", unsafe_allow_html=True)
+                st.plotly_chart(fig, use_container_width=True)
 
 
             # ------------------------------HÌNH 5: KHỚP LỆNH - THỎA THUẬN THEO NGÀNH------------------------
             st.subheader("Khớp lệnh - Thỏa thuận theo ngành trong ngày")
             folder = "Data GD"  # Thư mục chứa file
 
-            def get_file_date(filename):
+            def read_excel_data(date_str):
                 """
-                Ví dụ tên file:
-                FiinTrade_Ngành-chuyên-sâu_Phân-Loại-Nhà-Đầu-Tư__1 NGÀY_20221205.xlsx
-                => tách 20221205 => datetime.date(2022,12,5)
+                Lấy từ bảng tổng hợp Data GD (cùng vị trí cột như file Excel):
+                - A9..A27 => ngành (đã bỏ đuôi L2)
+                - B9..E27 => khớp lệnh: cột 1:5
+                - G9..J27 => thỏa thuận: cột 6:10
                 """
-                try:
-                    part = filename.split("__1 NGÀY_")[1]  # vd: "20220512.xlsx"
-                    date_str = part.replace(".xlsx", "")  # "20220512"
-                    file_dt = datetime.datetime.strptime(date_str, "%Y%m%d").date()
-                    return file_dt
-                except:
-                    return None
-
-            def read_excel_data(file_path):
-                """
-                - Ô B6 => ngày: df.iloc[5,1]
-                - A9..A27 => ngành: df.iloc[8:27,0]  (VD: Bất động sản L2)
-                - B9..E27 => khớp lệnh: df.iloc[8:27,1:5]
-                - G9..J27 => thỏa thuận: df.iloc[8:27,6:10]
-                """
-                df = pd.read_excel(file_path, sheet_name=0, header=None)
-                date_in_file = df.iloc[5, 1]  # (Không nhất thiết dùng, tùy)
-                sectors = df.iloc[8:27, 0].dropna().tolist()
-                matched_orders = df.iloc[8:27, 1:5].values
-                negotiated_orders = df.iloc[8:27, 6:10].values
-                return date_in_file, sectors, matched_orders, negotiated_orders
+                df = load_data_for_date(date_str)
+                sectors = df["Ngành"].tolist()
+                matched_orders = df.iloc[:, 1:5].values
+                negotiated_orders = df.iloc[:, 6:10].values
+                return sectors, matched_orders, negotiated_orders
 
             # (1) Cho người dùng chọn ngày (chỉ 1 ngày)
-            #    Tìm min_date, max_date trong folder => hiển thị date_input
-            all_dates = []
-            all_files = os.listdir(folder)
-            for fname in all_files:
-                if fname.endswith(".xlsx") and "__1 NGÀY_" in fname:
-                    dt = get_file_date(fname)
-                    if dt is not None:
-                        all_dates.append(dt)
-
-            if not all_dates:
+            #    Lấy min_date, max_date từ danh mục file Data GD (chỉ duyệt lại khi thư mục thay đổi)
+            catalog = data_functions.load_daily_flow_catalog(folder)
+
+            if not len(catalog):
                 st.warning("Thư mục Data GD không có file nào hợp lệ!")
             else:
-                min_date = min(all_dates)
-                max_date = max(all_dates)
+                min_date = catalog.dates[0].date()
+                max_date = catalog.dates[-1].date()
 
                 selected_date = st.date_input(
                     "Chọn ngày:",
@@ -721,14 +530,8 @@ def main():
                     format="DD/MM/YYYY"
                 )
 
-                # (2) Tìm file trong folder trùng ngày selected_date
-                matched_file_path = None
-                for fname in all_files:
-                    if fname.endswith(".xlsx") and "__1 NGÀY_" in fname:
-                        dt = get_file_date(fname)
-                        if dt == selected_date:
-                            matched_file_path = os.path.join(folder, fname)
-                            break
+                # (2) Tra file của ngày selected_date trong danh mục
+                matched_file_path = catalog.path(selected_date)
 
                 if matched_file_path is None:
                     # Không tìm thấy file cho ngày đã chọn => cảnh báo
@@ -736,7 +539,7 @@ def main():
                                "Vui lòng chọn ngày khác.")
                 else:
                     # (3) Đọc dữ liệu từ file
-                    date_in_file, sectors, matched_orders, negotiated_orders = read_excel_data(matched_file_path)
+                    sectors, matched_orders, negotiated_orders = read_excel_data(selected_date.strftime("%Y%m%d"))
 
                     # Tạo DF khớp lệnh & thỏa thuận
                     df_matched = pd.DataFrame(
@@ -814,73 +617,18 @@ def main():
 
             #---------------------------------------PIE CHART------------------------------------------
 
-            # --- Pie chart: Nước ngoài Khớp Ròng vs Nước ngoài Thỏa thuận Ròng ---
-            total_nuocngoai = abs(df_today["Nước ngoài Tổng GT Ròng"].astype(float).sum())
-            total_nuocngoai_khop = abs(df_today["Nước ngoài Khớp Ròng"].astype(float).sum())
-            total_nuocngoai_thoa = abs(df_today["Nước ngoài Thỏa thuận Ròng"].astype(float).sum())
-            perc_nuocngoai_khop = (total_nuocngoai_khop / total_nuocngoai) * 100 if total_nuocngoai != 0 else 0
-            perc_nuocngoai_thoa = (total_nuocngoai_thoa / total_nuocngoai) * 100 if total_nuocngoai != 0 else 0
-            data_pie_nuocngoai = {
-                "Loại": ["Nước ngoài Khớp Ròng", "Nước ngoài Thỏa thuận Ròng"],
-                "Tỷ lệ (%)": [perc_nuocngoai_khop, perc_nuocngoai_thoa]
-            }
-            fig_pie_nuocngoai = px.pie(data_pie_nuocngoai, values="Tỷ lệ (%)", names="Loại",
-                                       title="Tỷ lệ % giữa Nước ngoài Khớp Ròng và Nước ngoài Thỏa thuận Ròng",
-                                       hole=0.3)
-
-            # --- Pie chart: Tự doanh Khớp Ròng vs Tự doanh Thỏa thuận Ròng ---
-            total_tudn = abs(df_today["Tự doanh Tổng GT Ròng"].astype(float).sum())
-            total_tudn_khop = abs(df_today["Tự doanh Khớp Ròng"].astype(float).sum())
-            total_tudn_thoa = abs(df_today["Tự doanh Thỏa thuận Ròng"].astype(float).sum())
-            perc_tudn_khop = (total_tudn_khop / total_tudn) * 100 if total_tudn != 0 else 0
-            perc_tudn_thoa = (total_tudn_thoa / total_tudn) * 100 if total_tudn != 0 else 0
-            data_pie_tudn = {
-                "Loại": ["Tự doanh Khớp Ròng", "Tự doanh Thỏa thuận Ròng"],
-                "Tỷ lệ (%)": [perc_tudn_khop, perc_tudn_thoa]
-            }
-            fig_pie_tudn = px.pie(data_pie_tudn, values="Tỷ lệ (%)", names="Loại",
-                                  title="Tỷ lệ % giữa Tự doanh Khớp Ròng và Tự doanh Thỏa thuận Ròng", hole=0.3)
-
-            # Sắp xếp hai biểu đồ pie chart đầu tiên trên cùng 1 hàng
-            col1, col2 = st.columns(2)
-            with col1:
-                st.plotly_chart(fig_pie_nuocngoai, use_container_width=True)
-            with col2:
-                st.plotly_chart(fig_pie_tudn, use_container_width=True)
-
-            # --- Pie chart: Cá nhân Khớp Ròng vs Cá nhân Thỏa thuận Ròng ---
-            total_canhan = abs(df_today["Cá nhân Tổng GT Ròng"].astype(float).sum())
-            total_canhan_khop = abs(df_today["Cá nhân Khớp Ròng"].astype(float).sum())
-            total_canhan_thoa = abs(df_today["Cá nhân Thỏa thuận Ròng"].astype(float).sum())
-            perc_canhan_khop = (total_canhan_khop / total_canhan) * 100 if total_canhan != 0 else 0
-            perc_canhan_thoa = (total_canhan_thoa / total_canhan) * 100 if total_canhan != 0 else 0
-            data_pie_canhan = {
-                "Loại": ["Cá nhân Khớp Ròng", "Cá nhân Thỏa thuận Ròng"],
-                "Tỷ lệ (%)": [perc_canhan_khop, perc_canhan_thoa]
-            }
-            fig_pie_canhan = px.pie(data_pie_canhan, values="Tỷ lệ (%)", names="Loại",
-                                    title="Tỷ lệ % giữa Cá nhân Khớp Ròng và Cá nhân Thỏa thuận Ròng", hole=0.3)
-
-            # --- Pie chart: Tổ chức trong nước Khớp Ròng vs Tổ chức trong nước Thỏa thuận Ròng ---
-            total_tochuc = abs(df_today["Tổ chức trong nước Tổng GT Ròng"].astype(float).sum())
-            total_tochuc_khop = abs(df_today["Tổ chức trong nước Khớp Ròng"].astype(float).sum())
-            total_tochuc_thoa = abs(df_today["Tổ chức trong nước Thỏa thuận Ròng"].astype(float).sum())
-            perc_tochuc_khop = (total_tochuc_khop / total_tochuc) * 100 if total_tochuc != 0 else 0
-            perc_tochuc_thoa = (total_tochuc_thoa / total_tochuc) * 100 if total_tochuc != 0 else 0
-            data_pie_tochuc = {
-                "Loại": ["Tổ chức trong nước Khớp Ròng", "Tổ chức trong nước Thỏa thuận Ròng"],
-                "Tỷ lệ (%)": [perc_tochuc_khop, perc_tochuc_thoa]
-            }
-            fig_pie_tochuc = px.pie(data_pie_tochuc, values="Tỷ lệ (%)", names="Loại",
-                                    title="Tỷ lệ % giữa Tổ chức trong nước Khớp Ròng và Tổ chức trong nước Thỏa thuận Ròng",
-                                    hole=0.3)
+            # Tỷ lệ khớp lệnh/thỏa thuận đã tính sẵn theo ngày khi dựng bảng tổng hợp Data GD
+            split_ratios = data_functions.load_daily_flow_store().split_ratios.loc[:pd.Timestamp(current_date)]
 
-            # Sắp xếp hai biểu đồ pie chart tiếp theo trên cùng 1 hàng
-            col3, col4 = st.columns(2)
-            with col3:
-                st.plotly_chart(fig_pie_canhan, use_container_width=True)
-            with col4:
-                st.plotly_chart(fig_pie_tochuc, use_container_width=True)
+            # --- Pie chart: <loại nhà đầu tư> Khớp Ròng vs <loại nhà đầu tư> Thỏa thuận Ròng ---
+            # Sắp xếp hai biểu đồ pie chart trên cùng 1 hàng
+            for row_investors in (("Nước ngoài", "Tự doanh"), ("Cá nhân", "Tổ chức trong nước")):
+                for col, investor in zip(st.columns(2), row_investors):
+                    with col:
+                        st.plotly_chart(plot_flow_split_pie(split_ratios.iloc[-1], investor), use_container_width=True)
+
+            # --- Xu hướng tỷ lệ Khớp Ròng qua các phiên tới ngày đã chọn ---
+            st.plotly_chart(plot_flow_split_trend(split_ratios), use_container_width=True)
 
 
 
@@ -948,11 +696,9 @@ def main():
             price_file = "Vietnam_Price(Final).xlsx"
             volume_file = "Vietnam_volume(Final).xlsx"
 
-            df_temp = pd.read_excel(price_file)
-            date_cols_raw = df_temp.columns[2:]
-            date_cols_parsed = pd.to_datetime(date_cols_raw, format="%d/%m/%Y", dayfirst=True, errors="coerce")
-            valid_mask = ~date_cols_parsed.isna()
-            valid_date_cols = date_cols_parsed[valid_mask]
+            # Đọc + parse cột ngày một lần, dùng chung cho cả bong bóng và tỷ suất sinh lời
+            df_price = data_functions.load_date_frame(price_file, "float32")
+            valid_date_cols = pd.DatetimeIndex(df_price.columns[2:])
 
             if len(valid_date_cols) == 0:
                 st.error("Không tìm thấy cột ngày hợp lệ trong file giá!")
@@ -990,19 +736,18 @@ def main():
                         # ============ (3) Biểu đồ BONG BÓNG (circle packing) =============
 
                                     # ============ 3.1) Bubble Chart + df_final =============
-                        df_final = load_circle_packing_data(price_file, volume_file, start_dt, end_dt)
-                        df_final = df_final.sort_values(
-                            by=["sector", "volume", "PriceChange"],
-                            ascending=[False, False, False]
-                        )
-
-                        root_dict = build_hierarchical_data(df_final)
-                        json_data = json.dumps(root_dict, ensure_ascii=False)
-                        html_code = generate_circle_packing_html(json_data)
+                        bubble_group = st.radio("Nhóm bong bóng theo:", ["Ngành", "Ngành ICB (cấp 1 → 3)"], horizontal=True)
+                        bubble_levels = ("sector",) if bubble_group == "Ngành" else data_functions.ICB_LEVELS
+                        df_final, html_code = load_circle_packing_chart(
+                            price_file, volume_file, start_dt, end_dt, bubble_levels)
 
                         col_left, col_right = st.columns([1, 1])
                         with col_left:
-                            components.html(html_code, height=500, scrolling=False)
+                            if html_code is None:
+                                st.error(f"Chưa có thư viện D3 ({data_functions.D3_FILE}) => không vẽ được biểu đồ bong bóng. "
+                                         "Chạy `python Data_Functions.py` trên máy có mạng để tải về.")
+                            else:
+                                components.html(html_code, height=500, scrolling=False)
                         with col_right:
                             st.write("###### Thông tin về Giá và Khối lượng từng cổ phiếu")
                             st.dataframe(df_final)
@@ -1010,30 +755,22 @@ def main():
                                     # ============ 3.2) Biểu đồ Tỷ Suất Sinh Lời =============
                         st.subheader("Tỷ suất sinh lời trung bình theo ngành")
 
-                        # Dùng cùng logic: parse cột, check start_date_str, end_date_str
-                        df_ret = pd.read_excel(price_file)
-                        df_ret.columns = (
-                                ["symbol", "sector"]
-                                + pd.to_datetime(
-                            df_ret.columns[2:],
-                            format="%d/%m/%Y",
-                            dayfirst=True,
-                            errors="coerce"
-                        ).strftime("%Y-%m-%d").tolist()
-                        )
-
+                        # Dùng lại df_price đã đọc ở trên: check start_dt, end_dt
                         start_date_str = start_dt.strftime("%Y-%m-%d")
                         end_date_str = end_dt.strftime("%Y-%m-%d")
 
-                        if start_date_str not in df_ret.columns or end_date_str not in df_ret.columns:
+                        if start_dt not in df_price.columns or end_dt not in df_price.columns:
                             st.warning(
                                 f"Không tìm thấy cột {start_date_str} hoặc {end_date_str} trong file giá => không tính Return.")
                         else:
                             # Tính Return = (Giá cuối - Giá đầu)/Giá đầu
-                            df_ret["Return"] = (df_ret[end_date_str] - df_ret[start_date_str]) / df_ret[start_date_str]
+                            df_ret = df_price[["symbol", "sector"]].copy()
+                            start_price = data_functions.exact_float64(df_price[start_dt])
+                            end_price = data_functions.exact_float64(df_price[end_dt])
+                            df_ret["Return"] = (end_price - start_price) / start_price
 
                             # Group by sector => mean Return
-                            sector_returns = df_ret.groupby("sector")["Return"].mean().reset_index()
+                            sector_returns = df_ret.groupby("sector", observed=True)["Return"].mean().reset_index()
 
                             # 1) Tạo cột ReturnSign
                             sector_returns["ReturnSign"] = np.where(sector_returns["Return"] >= 0,
@@ -1080,25 +817,16 @@ def main():
                 st.subheader("Biến động giá cổ phiếu")
 
                 file_price = "Vietnam_Price(Final).xlsx"
-                df_price = pd.read_excel(file_price)
-
-                # 1) Parse cột ngày sau symbol, sector bằng parse_mixed_date
-                parsed_dates = [parse_mixed_date(str(c)) for c in df_price.columns[2:]]
-                df_price.columns = list(df_price.columns[:2]) + parsed_dates
 
-                # 2) Chuyển sang long format
-                df_price_melted = df_price.melt(
-                    id_vars=["symbol", "sector"],
-                    var_name="date",  # Timestamp
-                    value_name="price"
-                )
+                # Panel giá (mã x ngày, float32), xây một lần lúc tải dữ liệu
+                price_panel = data_functions.load_panel(file_price, "price")
 
                 # 3) Lấy danh sách cổ phiếu
-                stock_list = df_price["symbol"].unique()
+                stock_list = price_panel.symbols
                 selected_stocks = st.multiselect("Chọn mã cổ phiếu:", options=stock_list)
 
-                # 4) Xác định min_date, max_date từ cột 'date'
-                valid_dates = df_price_melted["date"].dropna()
+                # 4) Xác định min_date, max_date của panel
+                valid_dates = price_panel.dates
                 if valid_dates.empty:
                     st.error("Không có ngày hợp lệ trong file giá!")
                 else:
@@ -1129,11 +857,7 @@ def main():
                     end_dt_line = pd.to_datetime(end_date_line)
 
                     # 5) Lọc dữ liệu
-                    df_filtered = df_price_melted[
-                        (df_price_melted["symbol"].isin(selected_stocks)) &
-                        (df_price_melted["date"] >= start_dt_line) &
-                        (df_price_melted["date"] <= end_dt_line)
-                        ]
+                    df_filtered = price_panel.select(selected_stocks, start_dt_line, end_dt_line)
 
                     st.write(
                         f"Dữ liệu từ **{start_dt_line.strftime('%d/%m/%Y')}** "
@@ -1170,11 +894,14 @@ def main():
                                     )
 
                         with col_right:
+                            # Giảm điểm bằng LTTB theo từng mã (giữ điểm đầu/cuối, đỉnh và đáy)
+                            df_price_plot = functions.downsample_lttb(df_filtered, "date", "price", MAX_CHART_POINTS, group_by="symbol")
                             fig_price = px.line(
-                                df_filtered,
+                                df_price_plot,
                                 x="date",
                                 y="price",
                                 color="symbol",
+                                render_mode=functions.get_render_mode(len(df_price_plot)),
                                 title="Diễn biến giá cổ phiếu"
                             )
                             fig_price.update_layout(yaxis_title="Giá cổ phiếu", xaxis_title="Ngày", height=400)
@@ -1185,21 +912,11 @@ def main():
                 st.subheader("Khối lượng giao dịch")
 
                 file_volume = "Vietnam_volume(Final).xlsx"
-                df_volume = pd.read_excel(file_volume)
+                volume_panel = data_functions.load_panel(file_volume, "Volume", "integer")
 
-                # Parse cột ngày
-                parsed_dates_vol = [parse_mixed_date(str(c)) for c in df_volume.columns[2:]]
-                df_volume.columns = list(df_volume.columns[:2]) + parsed_dates_vol
+                stock_list_vol = volume_panel.symbols
 
-                df_volume_melted = df_volume.melt(
-                    id_vars=["symbol", "sector"],
-                    var_name="Date",
-                    value_name="Volume"
-                )
-
-                stock_list_vol = df_volume["symbol"].unique()
-
-                valid_dates_vol = df_volume_melted["Date"].dropna()
+                valid_dates_vol = volume_panel.dates
                 if valid_dates_vol.empty:
                     st.error("Không có ngày hợp lệ trong file volume!")
                 else:
@@ -1229,19 +946,18 @@ def main():
                     start_vol_dt = pd.to_datetime(start_vol)
                     end_vol_dt = pd.to_datetime(end_vol)
 
-                    df_selected_vol = df_volume_melted[
-                        (df_volume_melted["symbol"] == selected_stock_vol) &
-                        (df_volume_melted["Date"] >= start_vol_dt) &
-                        (df_volume_melted["Date"] <= end_vol_dt)
-                        ]
+                    df_selected_vol = volume_panel.select([selected_stock_vol], start_vol_dt, end_vol_dt).rename(
+                        columns={"date": "Date"})
 
                     st.write(
                         f"Dữ liệu từ **{start_vol_dt.strftime('%d/%m/%Y')}** "
                         f"đến **{end_vol_dt.strftime('%d/%m/%Y')}**"
                     )
 
+                    # Cột khối lượng: cộng dồn theo nhóm phiên liên tiếp bằng nhau (không bỏ phiên nào)
+                    df_volume_plot = functions.downsample_bars(df_selected_vol, "Date", "Volume", MAX_CHART_POINTS)
                     fig_volume = px.bar(
-                        df_selected_vol,
+                        df_volume_plot,
                         x="Date",
                         y="Volume",
                         title=f"Khối lượng giao dịch của {selected_stock_vol}"
@@ -1257,60 +973,13 @@ def main():
     elif dashboard_option == "Thống kê dòng tiền giao dịch":
         st.write("Thể hiện chi tiết thống kê về dòng tiền giao dịch trong thời gian được chọn.")
 
-        excel_file = "Thong_ke_gia_Phan_loai_NDT__VNINDEX(Final).xlsx"
-        df_ca_nhan_trong_nuoc = pd.read_excel(excel_file, sheet_name="Cá nhân trong nước (Ròng)")
-        df_ca_nhan_nuoc_ngoai = pd.read_excel(excel_file, sheet_name="Cá nhân nước ngoài (Ròng)")
-        df_to_chuc_trong_nuoc = pd.read_excel(excel_file, sheet_name="Tổ chức trong nước (Ròng)")
-        df_to_chuc_nuoc_ngoai = pd.read_excel(excel_file, sheet_name="Tổ chức nước ngoài (Ròng)")
-
-        # Giả sử mỗi sheet có cột:
-        #   Ngày, GT ròng khớp lệnh (nghìn VND), GT ròng thỏa thuận (nghìn VND)
-
-        # ============ 1) Chuẩn bị từng sheet: chỉ lấy 3 cột, rồi rename ============
-        df_ca_nhan_trong_nuoc = df_ca_nhan_trong_nuoc[["Ngày",
-                                                       "GT ròng khớp lệnh (nghìn VND)",
-                                                       "GT ròng thỏa thuận (nghìn VND)"]]
-        df_ca_nhan_trong_nuoc = df_ca_nhan_trong_nuoc.rename(columns={
-            "GT ròng khớp lệnh (nghìn VND)": "Cá nhân trong nước - Khớp",
-            "GT ròng thỏa thuận (nghìn VND)": "Cá nhân trong nước - Thỏa thuận"
-        })
-
-        df_ca_nhan_nuoc_ngoai = df_ca_nhan_nuoc_ngoai[["Ngày",
-                                                       "GT ròng khớp lệnh (nghìn VND)",
-                                                       "GT ròng thỏa thuận (nghìn VND)"]]
-        df_ca_nhan_nuoc_ngoai = df_ca_nhan_nuoc_ngoai.rename(columns={
-            "GT ròng khớp lệnh (nghìn VND)": "Cá nhân nước ngoài - Khớp",
-            "GT ròng thỏa thuận (nghìn VND)": "Cá nhân nước ngoài - Thỏa thuận"
-        })
-
-        df_to_chuc_trong_nuoc = df_to_chuc_trong_nuoc[["Ngày",
-                                                       "GT ròng khớp lệnh (nghìn VND)",
-                                                       "GT ròng thỏa thuận (nghìn VND)"]]
-        df_to_chuc_trong_nuoc = df_to_chuc_trong_nuoc.rename(columns={
-            "GT ròng khớp lệnh (nghìn VND)": "Tổ chức trong nước - Khớp",
-            "GT ròng thỏa thuận (nghìn VND)": "Tổ chức trong nước - Thỏa thuận"
-        })
-
-        df_to_chuc_nuoc_ngoai = df_to_chuc_nuoc_ngoai[["Ngày",
-                                                       "GT ròng khớp lệnh (nghìn VND)",
-                                                       "GT ròng thỏa thuận (nghìn VND)"]]
-        df_to_chuc_nuoc_ngoai = df_to_chuc_nuoc_ngoai.rename(columns={
-            "GT ròng khớp lệnh (nghìn VND)": "Tổ chức nước ngoài - Khớp",
-            "GT ròng thỏa thuận (nghìn VND)": "Tổ chức nước ngoài - Thỏa thuận"
-        })
-
-        # ============ 2) Gộp 4 sheet thành 1 DF wide-format theo cột "Ngày" ============
-        wide_df = pd.merge(df_ca_nhan_trong_nuoc, df_ca_nhan_nuoc_ngoai, on="Ngày", how="outer")
-        wide_df = pd.merge(wide_df, df_to_chuc_trong_nuoc, on="Ngày", how="outer")
-        wide_df = pd.merge(wide_df, df_to_chuc_nuoc_ngoai, on="Ngày", how="outer")
-
-        # Chuyển cột "Ngày" thành datetime, sắp xếp
-        wide_df["Ngày"] = pd.to_datetime(wide_df["Ngày"], errors="coerce")
-        wide_df = wide_df.sort_values("Ngày")
+        # ============ 1) + 2) Đọc 4 sheet (Ròng) trong một lần mở file, gộp thành DF wide-format theo "Ngày" ============
+        # Index: Ngày (đã sắp xếp), cột MultiIndex (Nhà đầu tư, Loại) với Loại là Khớp/Thỏa thuận (có bộ nhớ đệm)
+        wide_df = data_functions.load_flow_statistics()
 
         # ============ 3) Cho user chọn khoảng thời gian ============
-        min_date = wide_df["Ngày"].min()
-        max_date = wide_df["Ngày"].max()
+        min_date = wide_df.index.min()
+        max_date = wide_df.index.max()
 
         start_date = st.sidebar.date_input("Chọn ngày bắt đầu:", value=min_date,
                                            min_value=min_date, max_value=max_date)
@@ -1322,32 +991,16 @@ def main():
             return
 
         # Lọc wide_df theo khoảng thời gian
-        mask = (wide_df["Ngày"] >= pd.to_datetime(start_date)) & (wide_df["Ngày"] <= pd.to_datetime(end_date))
+        mask = (wide_df.index >= pd.to_datetime(start_date)) & (wide_df.index <= pd.to_datetime(end_date))
         filtered_df = wide_df[mask].copy()
         if filtered_df.empty:
             st.warning("Không có dữ liệu trong khoảng thời gian này!")
             return
 
         # ============ 4) Chuyển sang long_df ============
-        value_vars = [c for c in filtered_df.columns if c != "Ngày"]
-        long_df = filtered_df.melt(
-            id_vars="Ngày",
-            value_vars=value_vars,
-            var_name="variable",
-            value_name="value"
-        )
-
-        # Tách "variable" => 2 cột: "Nhà đầu tư" và "Loại"
-        def parse_variable(var):
-            splitted = var.split(" - ")
-            if len(splitted) == 2:
-                investor, order_type = splitted
-            else:
-                investor, order_type = (var, "Unknown")
-            return investor, order_type
-
-        long_df[["Nhà đầu tư", "Loại"]] = long_df["variable"].apply(lambda x: pd.Series(parse_variable(x)))
-        long_df.drop(columns="variable", inplace=True)
+        # Hai mức cột (Nhà đầu tư, Loại) => melt ra thẳng 2 cột "Nhà đầu tư" và "Loại"
+        long_df = filtered_df.melt(value_name="value", ignore_index=False).reset_index()
+        long_df = data_functions.categorize_columns(long_df, {"Nhà đầu tư": "investor", "Loại": "order_type"})
 
         # Convert value sang float, NaN => 0
         long_df["value"] = pd.to_numeric(long_df["value"], errors="coerce").fillna(0)